@@ -0,0 +1,88 @@
+import json
+import os
+import re
+import threading
+from bulk_scheduler import TokenBucket
+from telemetry import rate_limits
+
+ACCOUNTS_PATH = "accounts.json"
+
+class Account:
+    """A Mastodon account to schedule for, with its own client, rate limit budget and local files.
+
+    The account from .env has no name and keeps the original file names,
+    named accounts get their name added to them, e.g. post_history.art.db"""
+
+    def __init__(self, instance_url: str, access_token: str, name: str = None):
+        self.instance_url = instance_url
+        self.access_token = access_token
+        self.name = name
+        self.bucket = TokenBucket() # every instance has its own rate limit
+        rate_limits[name or "default"] = self.bucket
+        self.lock = threading.Lock()
+
+        self._mastodon = None
+        self._history = None
+        self._outbox = None
+
+    def file_path(self, path: str):
+        if self.name is None:
+            return path
+
+        base, extension = os.path.splitext(path)
+        return f"{base}.{re.sub(r'[^A-Za-z0-9_-]', '_', self.name)}{extension}"
+
+    def get_mastodon(self):
+        """Return the account's Mastodon client, creating it on first use"""
+        with self.lock:
+            if self._mastodon is None:
+                from mastodon import Mastodon #mastodon post gen
+                from client import TIMEOUT, get_session
+
+                # 429s are handled by the token bucket instead of Mastodon.py sleeping inside the request
+                self._mastodon = Mastodon(
+                    access_token=self.access_token,
+                    api_base_url=self.instance_url,
+                    ratelimit_method="throw",
+                    request_timeout=TIMEOUT,
+                    session=get_session()
+                )
+
+            return self._mastodon
+
+    def get_history(self):
+        from history import HISTORY_PATH, PostHistory
+
+        with self.lock:
+            if self._history is None:
+                self._history = PostHistory(self.file_path(HISTORY_PATH))
+
+            return self._history
+
+    def get_outbox(self):
+        from outbox import OUTBOX_PATH, Outbox
+
+        with self.lock:
+            if self._outbox is None:
+                self._outbox = Outbox(self.file_path(OUTBOX_PATH))
+
+            return self._outbox
+
+    def __str__(self):
+        return self.name or self.instance_url
+
+def load_accounts(path=ACCOUNTS_PATH) -> list[Account]:
+    """The accounts listed in the optional accounts file, as a list of
+    {"name": ..., "instance_url": ..., "access_token": ...} objects"""
+    if not os.path.exists(path):
+        return []
+
+    with open(path, encoding="utf-8") as file:
+        entries = json.load(file)
+
+    names = [entry.get("name") for entry in entries]
+
+    if None in names or len(set(names)) != len(names):
+        raise ValueError(f"Every account in {path} needs a unique name")
+
+    return [Account(entry["instance_url"], entry["access_token"], entry["name"]) for entry in entries]
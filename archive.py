@@ -0,0 +1,229 @@
+import codecs
+import csv
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+from telemetry import timed
+
+ARCHIVE_URL = "https://docs.google.com/spreadsheets/d/1rEofPkliKppvttd8pEX8H6DtSljlfmQLdFR-SlyyX7E/export?format=csv"
+CACHE_PATH = "archive_cache.db"
+CACHE_VERSION = 1 # bump whenever the cached columns change
+
+CHUNK_SIZE = 64 * 1024
+
+stats = {"hits": 0, "misses": 0, "load_time": 0.0, "size": 0}
+
+class Video:
+    """An archive entry holding only the columns the scheduler uses"""
+
+    __slots__ = ("year", "month", "title", "channel", "alt_link")
+
+    def __init__(self, year: str, month: str, title: str, channel: str, alt_link: str):
+        self.year = year
+        self.month = month
+        self.title = title
+        self.channel = sys.intern(channel) # channels repeat a lot, so share one string per channel
+        self.alt_link = alt_link
+
+    def __iter__(self):
+        return (getattr(self, column) for column in self.__slots__)
+
+    def __repr__(self):
+        return f"Video({', '.join(repr(value) for value in self)})"
+
+def iter_csv_lines(chunks, hasher=None):
+    """Decode byte chunks into the lines csv.reader expects, without ever holding the whole body.
+    The raw bytes are fed to hasher along the way if one is given"""
+
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+
+    for chunk in chunks:
+        if hasher:
+            hasher.update(chunk)
+
+        lines = (pending + decoder.decode(chunk)).split("\n")
+        pending = lines.pop()
+
+        for line in lines:
+            yield line + "\n"
+
+    pending += decoder.decode(b"", final=True)
+
+    if pending:
+        yield pending
+
+def parse_archive(chunks, hasher=None, config: dict = None):
+    """Parse a csv from an iterable of byte chunks into Videos, mapping its columns by the header and
+    leaving out incomplete rows and the rows the config's rules exclude (blacklisted videos by default)"""
+    from archive_sources import RowLayout, load_archive_config
+
+    reader = csv.reader(iter_csv_lines(chunks, hasher))
+    header = next(reader, None)
+
+    if header is None:
+        return []
+
+    return RowLayout(header, config or load_archive_config()).videos(reader)
+
+class ArchiveCache:
+    """Parsed archive rows stored in a local sqlite database along with
+    the validators needed to check whether the remote sheet changed"""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+
+        with self.connect() as db:
+            if db.execute("PRAGMA user_version").fetchone()[0] != CACHE_VERSION:
+                db.execute("DROP TABLE IF EXISTS meta")
+                db.execute("DROP TABLE IF EXISTS videos")
+                db.execute(f"PRAGMA user_version = {CACHE_VERSION}")
+
+            db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            db.execute("CREATE TABLE IF NOT EXISTS videos (year TEXT, month TEXT, title TEXT, channel TEXT, alt_link TEXT)")
+
+    def connect(self):
+        # A new connection per call so the background refresh can use the cache from its own thread
+        return sqlite3.connect(self.path)
+
+    def meta(self) -> dict[str, str]:
+        with self.connect() as db:
+            return dict(db.execute("SELECT key, value FROM meta"))
+
+    def load(self, config_hash: str = None):
+        """Return the cached rows, or None if nothing has been cached yet or they were read with a different config"""
+        meta = self.meta()
+
+        if "content_hash" not in meta or meta.get("config") != config_hash:
+            return None
+
+        with self.connect() as db:
+            return [Video(*row) for row in db.execute("SELECT * FROM videos ORDER BY rowid")]
+
+    def store(self, rows: list[Video], validators: dict[str, str]):
+        with self.connect() as db:
+            db.execute("DELETE FROM videos")
+            db.executemany("INSERT INTO videos VALUES (?, ?, ?, ?, ?)", map(tuple, rows))
+            db.execute("DELETE FROM meta")
+            db.executemany("INSERT INTO meta VALUES (?, ?)", validators.items())
+
+    def size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+def archive_url():
+    """The sheet export, unless archive_url is set in the environment (or .env), e.g. to a local copy"""
+    return os.getenv("archive_url") or ARCHIVE_URL
+
+def refresh_archive(cache: ArchiveCache, config: dict = None):
+    """Download the archive if it changed since it was cached.
+    Returns the new rows, or None if the cached copy is still current"""
+
+    from archive_sources import fingerprint, load_archive_config
+    from client import get_session
+
+    config = config or load_archive_config()
+    config_hash = fingerprint(config)
+    meta = cache.meta()
+    headers = {}
+
+    if meta.get("config") != config_hash:
+        meta = {} # the cached rows were read differently, so they're replaced whether the archive changed or not
+    elif "etag" in meta:
+        headers["If-None-Match"] = meta["etag"]
+    if "last_modified" in meta:
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    with get_session().get(config["source"], headers=headers, stream=True) as response:
+        if response.status_code == 304:
+            return None
+
+        response.raise_for_status()
+
+        # The sheet export doesn't always send validators, so fall back to comparing the content itself.
+        # The hash is only known once the body is read, so it's computed while parsing
+        hasher = hashlib.sha256()
+
+        # The body is downloaded as it's parsed, so this is the download and parse time together
+        with timed("archive_download_parse"):
+            rows = parse_archive(response.iter_content(CHUNK_SIZE), hasher, config)
+
+    content_hash = hasher.hexdigest()
+
+    if content_hash == meta.get("content_hash"):
+        return None
+
+    validators = {"content_hash": content_hash, "config": config_hash}
+
+    if "ETag" in response.headers:
+        validators["etag"] = response.headers["ETag"]
+    if "Last-Modified" in response.headers:
+        validators["last_modified"] = response.headers["Last-Modified"]
+
+    with timed("archive_cache_store"):
+        cache.store(rows, validators)
+
+    return rows
+
+def report(source: str, rows: list, started: float, size: int, kind="cached"):
+    stats["load_time"] = time.perf_counter() - started
+    stats["size"] = size
+
+    print(f"Archive {source} in {stats['load_time']:.2f}s ({len(rows)} videos, {stats['size'] / 1_000_000:.1f} MB {kind}, {stats['hits']} hits, {stats['misses']} misses)")
+
+def load_archive(on_refresh=None, cache: ArchiveCache = None, config: dict = None):
+    """Return the archive rows from the source in archive.json, the remote sheet by default.
+
+    Local files are read directly. A remote archive is served from the local cache right away when there is one,
+    revalidated against the remote copy from a background thread and on_refresh(rows) is called with the new rows if it changed"""
+
+    from archive_sources import fingerprint, load_archive_config, local_source
+
+    config = config or load_archive_config()
+    started = time.perf_counter()
+    source = local_source(config)
+
+    if source:
+        with timed("archive_file_load"):
+            rows = source.load()
+
+        report(f"loaded from {source.describe()}", rows, started, source.size(), "on disk")
+        return rows
+
+    cache = cache or ArchiveCache()
+
+    with timed("archive_cache_load"):
+        rows = cache.load(fingerprint(config))
+
+    if rows is None:
+        stats["misses"] += 1
+        rows = refresh_archive(cache, config)
+        report("downloaded", rows, started, cache.size())
+        return rows
+
+    stats["hits"] += 1
+    report("loaded from cache", rows, started, cache.size())
+
+    def revalidate():
+        import requests
+
+        started = time.perf_counter()
+
+        try:
+            new_rows = refresh_archive(cache, config)
+        except requests.RequestException as e:
+            return print("\033[93m", f"Couldn't refresh the archive, using the cached copy: {e}", "\033[00m")
+
+        if new_rows is None:
+            return
+
+        stats["misses"] += 1
+        report("refreshed", new_rows, started, cache.size())
+
+        if on_refresh:
+            on_refresh(new_rows)
+
+    threading.Thread(target=revalidate, daemon=True).start()
+    return rows
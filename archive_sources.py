@@ -0,0 +1,333 @@
+"""Where the archive comes from and how its rows are read.
+
+archive.json picks the source (the sheet export or another URL, a local CSV, SQLite or Parquet file),
+maps the columns the scheduler needs to the archive's own column names, and lists include and exclude
+rules for the rows. The mapping and rules are compiled into one function when the archive is loaded,
+so they cost about the same as the fixed indices and blacklist check they replace"""
+
+import csv
+import hashlib
+import json
+import mmap
+import os
+import re
+import sqlite3
+from array import array
+from collections.abc import Sequence
+from constants import ArchiveIndices as ARC_I
+from archive import Video, archive_url
+
+ARCHIVE_CONFIG_PATH = "archive.json"
+
+# The columns of the sheet export the scheduler uses, found at their usual positions if the headers change
+DEFAULT_COLUMNS = {"year": "Year", "month": "Month", "title": "Title", "channel": "Channel", "alt_link": "Alternate link"}
+DEFAULT_INDICES = {"year": ARC_I.YEAR, "month": ARC_I.MONTH, "title": ARC_I.TITLE, "channel": ARC_I.CHANNEL, "alt_link": ARC_I.ALT_LINK}
+DEFAULT_EXCLUDE = [{"column": "channel", "contains": "[BLACKLIST]"}]
+
+# Python expressions for each rule, cell is the row's value and value the rule's
+OPERATORS = {
+    "equals": "{cell} == {value}",
+    "contains": "{value} in {cell}",
+    "in": "{cell} in {value}",
+    "matches": "{value}.search({cell}) is not None",
+    "min": "at_least({cell}, {value})",
+    "max": "at_most({cell}, {value})",
+    "empty": "(not {cell}.strip()) == {value}"
+}
+
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+# The offsets of a CSV's kept rows are stored next to it after the first load, behind a fixed size header
+INDEX_HEADER_SIZE = 128
+INDEX_VERSION = 1
+
+def load_archive_config(path=ARCHIVE_CONFIG_PATH) -> dict:
+    """The archive source, column names and row rules from the optional archive.json, filled in with the defaults"""
+    config = {}
+
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as file:
+            config = json.load(file)
+
+    return {
+        "source": config.get("source") or archive_url(),
+        "table": config.get("table", "videos"),
+        "columns": DEFAULT_COLUMNS | config.get("columns", {}),
+        "include": config.get("include", []),
+        "exclude": config.get("exclude", DEFAULT_EXCLUDE)
+    }
+
+def fingerprint(config: dict) -> str:
+    """Changes whenever the config would read different rows"""
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+def to_number(value: str):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+def at_least(value: str, bound: float):
+    number = to_number(value)
+    return number is not None and number >= bound
+
+def at_most(value: str, bound: float):
+    number = to_number(value)
+    return number is not None and number <= bound
+
+def source_columns(config: dict) -> list[str]:
+    """The names of every column a source has to provide, in the order RowLayout expects them for sources
+    that can pick their columns, the mapped columns first and then the ones only rules look at"""
+    columns = list(config["columns"][column] for column in Video.__slots__)
+
+    for rule in config["include"] + config["exclude"]:
+        if rule["column"] not in Video.__slots__ and rule["column"] not in columns:
+            columns.append(rule["column"])
+
+    return columns
+
+class RowLayout:
+    """Turns raw rows with the given header into Videos, keeping only the rows the rules allow.
+
+    rule columns are either one of the Video columns or any other column name of the archive.
+    Names are matched ignoring case and surrounding whitespace"""
+
+    def __init__(self, header: list[str], config: dict):
+        self.positions = {}
+
+        for i, name in reversed(list(enumerate(header))):
+            self.positions[name.strip().lstrip("\ufeff").lower()] = i # the BOM some editors start files with
+
+        self.indices = [self.index(column, config) for column in Video.__slots__]
+        used = list(self.indices)
+        namespace = {"Video": Video, "at_least": at_least, "at_most": at_most}
+
+        def expression(rule: dict):
+            column = rule["column"]
+            index = self.indices[Video.__slots__.index(column)] if column in Video.__slots__ else self.index(column, config)
+            used.append(index)
+            operator = next((operator for operator in OPERATORS if operator in rule), None)
+
+            if operator is None:
+                raise ValueError(f"The archive rule {rule} needs one of {', '.join(OPERATORS)}")
+
+            value = rule[operator]
+
+            if operator == "in":
+                value = frozenset(value)
+            elif operator == "matches":
+                value = re.compile(value)
+            elif operator in ("min", "max"):
+                value = float(value)
+
+            # Values are passed in by name instead of being written into the code
+            name = f"value{len(namespace)}"
+            namespace[name] = value
+
+            return OPERATORS[operator].format(cell=f"row[{index}]", value=name)
+
+        includes = [expression(rule) for rule in config["include"]]
+        excludes = [expression(rule) for rule in config["exclude"]]
+        # Rows too short to have every column used are incomplete
+        self.condition = " and ".join([f"len(row) > {max(used)}"] + includes + [f"not ({exclude})" for exclude in excludes])
+        cells = ", ".join(f"row[{index}]" for index in self.indices)
+
+        self.keep = eval(f"lambda row: {self.condition}", namespace)
+        self.video = eval(f"lambda row: Video({cells})", namespace)
+        self.videos = eval(f"lambda rows: [Video({cells}) for row in rows if {self.condition}]", namespace)
+
+    def index(self, column: str, config: dict) -> int:
+        name = config["columns"].get(column, column)
+
+        if name.strip().lower() in self.positions:
+            return self.positions[name.strip().lower()]
+
+        if column in DEFAULT_INDICES and name == DEFAULT_COLUMNS[column]:
+            return DEFAULT_INDICES[column] # the sheet's usual layout, from before columns were mapped by name
+
+        raise ValueError(f"The archive has no {name!r} column, its columns are {', '.join(sorted(self.positions, key=self.positions.get))}")
+
+def iter_mapped_lines(mm, start: int, position: list):
+    """Decode the lines of mm from start one at a time, keeping position[0] at the end of the last line handed out"""
+    position[0] = start
+    size = len(mm)
+
+    while position[0] < size:
+        end = mm.find(b"\n", position[0])
+        end = size if end == -1 else end + 1
+
+        line = mm[position[0]:end].decode("utf-8")
+        position[0] = end
+
+        yield line
+
+class MappedArchive(Sequence):
+    """The kept rows of a CSV file, read straight from the memory mapped file as they're accessed.
+
+    Only the byte offsets of the rows are held in memory, so a large archive opens without parsing it,
+    once its offsets were found by the first load"""
+
+    def __init__(self, mm, offsets, layout: RowLayout, index_mm=None):
+        self.mm = mm
+        self.offsets = offsets
+        self.layout = layout
+        self.index_mm = index_mm # keeps the mapped offsets alive
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+
+        # Quoted values can span lines, so the reader is given as many lines as the row needs
+        row = next(csv.reader(iter_mapped_lines(self.mm, self.offsets[i], [0])))
+        return self.layout.video(row)
+
+class CsvFileSource:
+    def __init__(self, path: str, config: dict):
+        self.path = path
+        self.config = config
+        self.index_path = path + ".idx"
+
+    def describe(self):
+        return self.path
+
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def index_key(self) -> bytes:
+        stat = os.stat(self.path)
+        key = json.dumps({"version": INDEX_VERSION, "size": stat.st_size, "mtime": stat.st_mtime_ns, "config": fingerprint(self.config)})
+
+        return key.encode().ljust(INDEX_HEADER_SIZE - 1) + b"\n"
+
+    def load(self) -> MappedArchive:
+        with open(self.path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                raise ValueError(f"{self.path} is empty")
+
+            mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        position = [0]
+        reader = csv.reader(iter_mapped_lines(mm, 0, position))
+        layout = RowLayout(next(reader), self.config)
+
+        offsets, index_mm = self.load_index()
+
+        if offsets is None:
+            offsets = self.build_index(reader, position, layout)
+
+        return MappedArchive(mm, offsets, layout, index_mm)
+
+    def load_index(self):
+        """The offsets saved by an earlier load of the same file with the same config, mapped without copying them"""
+        if not os.path.exists(self.index_path):
+            return None, None
+
+        with open(self.index_path, "rb") as file:
+            if file.read(INDEX_HEADER_SIZE) != self.index_key():
+                return None, None
+
+            if os.fstat(file.fileno()).st_size == INDEX_HEADER_SIZE:
+                return array("Q"), None # nothing kept
+
+            index_mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return memoryview(index_mm)[INDEX_HEADER_SIZE:].cast("Q"), index_mm
+
+    def build_index(self, reader, position: list, layout: RowLayout):
+        """Find the offsets of the kept rows, reading the file one row at a time, and save them for the next load"""
+        offsets = array("Q")
+        keep = layout.keep
+
+        while True:
+            start = position[0]
+            row = next(reader, None)
+
+            if row is None:
+                break
+
+            if keep(row):
+                offsets.append(start)
+
+        try:
+            with open(self.index_path + ".tmp", "wb") as file:
+                file.write(self.index_key())
+                offsets.tofile(file)
+
+            os.replace(self.index_path + ".tmp", self.index_path)
+        except OSError as e:
+            print("\033[93m", f"Couldn't save the archive index, the next load will read the whole file again: {e}", "\033[00m")
+
+        return offsets
+
+class SqliteSource:
+    def __init__(self, path: str, config: dict):
+        self.path = path
+        self.config = config
+
+    def describe(self):
+        return f"{self.path} ({self.config['table']})"
+
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def load(self) -> list[Video]:
+        columns = source_columns(self.config)
+        quote = lambda name: '"' + name.replace('"', '""') + '"'
+
+        # Numbers and NULLs come back as the text the CSV would have had
+        selected = [f"COALESCE(CAST({quote(column)} AS TEXT), '')" for column in columns]
+        query = f"SELECT {', '.join(selected)} FROM {quote(self.config['table'])}"
+
+        with sqlite3.connect(f"file:{self.path}?mode=ro", uri=True) as db:
+            try:
+                return RowLayout(columns, self.config).videos(db.execute(query))
+            except sqlite3.OperationalError as e:
+                raise ValueError(f"Couldn't read the archive from {self.describe()}: {e}") from e
+
+class ParquetSource:
+    def __init__(self, path: str, config: dict):
+        self.path = path
+        self.config = config
+
+    def describe(self):
+        return self.path
+
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def load(self) -> list[Video]:
+        try:
+            import pyarrow.parquet as pq #parquet archives only
+        except ImportError as e:
+            raise RuntimeError("Reading a Parquet archive needs pyarrow, install it with pip install pyarrow") from e
+
+        names = {name.lower(): name for name in pq.read_schema(self.path).names}
+        columns = source_columns(self.config)
+        missing = [column for column in columns if column.strip().lower() not in names]
+
+        if missing:
+            raise ValueError(f"The archive has no {', '.join(map(repr, missing))} column, its columns are {', '.join(names.values())}")
+
+        table = pq.read_table(self.path, columns=[names[column.strip().lower()] for column in columns])
+        values = [["" if value is None else str(value) for value in table.column(i).to_pylist()] for i in range(len(columns))]
+
+        return RowLayout(columns, self.config).videos(zip(*values))
+
+def local_source(config: dict):
+    """The source for a local file, or None if the source is a URL"""
+    source = config["source"]
+
+    if re.match(r"https?://", source):
+        return None
+
+    extension = os.path.splitext(source)[1].lower()
+
+    if extension in SQLITE_EXTENSIONS:
+        return SqliteSource(source, config)
+    if extension == ".parquet":
+        return ParquetSource(source, config)
+
+    return CsvFileSource(source, config)
@@ -0,0 +1,145 @@
+"""Batch re-rolls and gap fills.
+
+Every slot of a batch is written to a journal before anything is sent, then the delete and create
+calls for the slots run concurrently within the rate limit budget. The journal is updated after each
+call, so a batch that was interrupted can be resumed without losing or doubling up posts"""
+
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from bulk_scheduler import TokenBucket, call_with_backoff, schedule_post
+from schedule_model import Gap, ScheduledPost
+from schedule_time import get_zone, localize_series
+
+JOURNAL_PATH = "batch_journal.json"
+
+# Mastodon refuses to schedule posts less than 5 minutes ahead
+MIN_LEAD_TIME = timedelta(minutes=5)
+
+class BatchJournal:
+    """The slots of the running batch, kept on disk until every one of them is done.
+
+    Each entry is a dict with the slot's time, the post it replaces if any (old_id),
+    the video and message of the new post, the idempotency key to create it with,
+    and how far along it is (new_id once created, deleted once the old post is gone)"""
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = []
+
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                self.entries = json.load(file)
+
+    def add(self, scheduled_time: datetime, video, message: str, old_id=None):
+        self.entries.append({
+            "time": scheduled_time.astimezone(timezone.utc).isoformat(),
+            "old_id": old_id and str(old_id),
+            "title": video.title,
+            "alt_link": video.alt_link,
+            "message": message,
+            "key": uuid.uuid4().hex,
+            "new_id": None,
+            "deleted": False,
+            "skipped": False
+        })
+
+    def update(self, entry: dict, **changes):
+        with self.lock:
+            entry.update(changes)
+            self.save()
+
+    def save(self):
+        # Written to a temporary file first so a crash mid write can't leave a broken journal behind
+        with open(self.path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(self.entries, file)
+
+        os.replace(self.path + ".tmp", self.path)
+
+    def pending(self):
+        return [entry for entry in self.entries if not is_done(entry)]
+
+    def clear(self):
+        self.entries = []
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def is_done(entry: dict):
+    return entry["skipped"] or (entry["new_id"] is not None and (entry["old_id"] is None or entry["deleted"]))
+
+def entry_time(entry: dict):
+    return datetime.fromisoformat(entry["time"])
+
+def entry_post(entry: dict) -> ScheduledPost:
+    """The post that fills the entry's slot now"""
+    return ScheduledPost(entry["title"], entry["new_id"], entry_time(entry))
+
+def gap_slots(gap: Gap, timezone: str, now: datetime):
+    """The daily times in the gap, at the time of day of the post after it in the given timezone.
+    Slots are counted back in local time so they stay on the same wall clock time across DST changes"""
+    zone = get_zone(timezone)
+    end = gap.end.astimezone(zone).replace(tzinfo=None)
+    slots = localize_series(zone, [end - timedelta(days=days) for days in range(gap.days, 0, -1)])
+
+    return [slot for slot in slots if slot > now + MIN_LEAD_TIME]
+
+def reroll_candidates(posts, now: datetime):
+    """The posts that are far enough ahead to be replaced"""
+    return [post for post in posts if post.scheduled_time > now + MIN_LEAD_TIME]
+
+def run_batch(mastodon, bucket: TokenBucket, journal: BatchJournal, on_done=None, headroom=1, max_workers=4):
+    """Work through the journal's pending slots concurrently, calling on_done(entry) from a worker
+    thread as each slot is finished. The journal is cleared once every slot is done.
+
+    headroom is how many more posts the account can have scheduled. With room to spare a replacement
+    is created before the old post is deleted so a day is never left empty, otherwise the old post is
+    deleted first and the journal makes sure the slot is filled again on resume"""
+
+    from mastodon import MastodonNotFoundError
+
+    create_first = headroom > 0
+    workers = max(1, min(max_workers, headroom)) if create_first else max_workers
+
+    def create(entry):
+        if entry["new_id"] is not None:
+            return
+
+        post_id = schedule_post(mastodon, bucket, entry["message"], int(entry_time(entry).timestamp()), entry["key"])
+        journal.update(entry, new_id=str(post_id))
+
+    def delete(entry):
+        if entry["old_id"] is None or entry["deleted"]:
+            return
+
+        try:
+            call_with_backoff(mastodon, bucket, mastodon.scheduled_status_delete, entry["old_id"])
+        except MastodonNotFoundError:
+            pass # published or removed in the meantime
+
+        journal.update(entry, deleted=True)
+
+    def process(entry):
+        if entry["new_id"] is None and entry_time(entry) <= datetime.now(tz=timezone.utc) + MIN_LEAD_TIME:
+            # Too late to schedule anything in this slot, whatever is still there stays
+            print("\033[93m", f"Skipped the slot at {entry['time']}, it's less than 5 minutes away", "\033[00m")
+            return journal.update(entry, skipped=True)
+
+        for step in (create, delete) if create_first else (delete, create):
+            step(entry)
+
+        if on_done:
+            on_done(entry)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(process, entry) for entry in journal.pending()]
+        errors = [future.exception() for future in futures if future.exception()]
+
+    if errors:
+        raise errors[0]
+
+    journal.clear()
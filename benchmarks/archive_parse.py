@@ -0,0 +1,83 @@
+"""Compare parse time and peak RSS of the streaming archive parser against
+the old decode-everything approach on a synthetic archive.
+
+Run from the repository root with ``python -m benchmarks.archive_parse --rows 200000``"""
+
+import argparse
+import csv
+import io
+import multiprocessing
+import os
+import random
+import resource
+import tempfile
+import time
+from archive import CHUNK_SIZE, parse_archive
+
+HEADER = ["Year", "Month", "Rank", "Link", "Title", "Channel", "Upload date", "State", "Alternate link"]
+
+def write_synthetic_archive(path: str, rows: int, channels=2000):
+    random.seed(0)
+
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(HEADER)
+
+        for i in range(rows):
+            channel = f"Channel {random.randrange(channels)}" + (" [BLACKLIST]" if random.random() < 0.01 else "")
+            writer.writerow([
+                2012 + i % 12, 1 + i % 12, 1 + i % 10, f"https://youtu.be/{i:011d}", f'Video "{i}", part {i % 7}',
+                channel, "2020-01-01", "", f"https://pony.tube/w/{i:011d}"
+            ])
+
+def parse_whole(path: str):
+    """The original fetch_archive approach: decode the whole body and keep every column of every row"""
+    with open(path, "rb") as file:
+        csv_str = file.read().decode()
+
+    reader = csv.reader(io.StringIO(csv_str))
+    archive = [entry for entry in reader if "[BLACKLIST]" not in entry[5]]
+    del archive[0]
+
+    return archive
+
+def parse_streaming(path: str):
+    with open(path, "rb") as file:
+        return parse_archive(iter(lambda: file.read(CHUNK_SIZE), b""))
+
+def measure(parser_name: str, path: str, results):
+    # Runs in a fresh process so ru_maxrss only covers this parser
+    parser = globals()[parser_name]
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    started = time.perf_counter()
+    rows = parser(path)
+    elapsed = time.perf_counter() - started
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((len(rows), elapsed, peak, peak - baseline))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "archive.csv")
+        write_synthetic_archive(path, args.rows)
+        print(f"Synthetic archive: {args.rows} rows, {os.path.getsize(path) / 1_000_000:.1f} MB")
+
+        context = multiprocessing.get_context("spawn")
+
+        for name in ("parse_whole", "parse_streaming"):
+            results = context.Queue()
+            process = context.Process(target=measure, args=(name, path, results))
+            process.start()
+            count, elapsed, peak, growth = results.get()
+            process.join()
+
+            # ru_maxrss is in kilobytes on Linux
+            print(f"{name:16} {count} videos in {elapsed:.2f}s, peak RSS {peak / 1024:.1f} MB (+{growth / 1024:.1f} MB while parsing)")
+
+if __name__ == "__main__":
+    main()
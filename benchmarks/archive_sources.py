@@ -0,0 +1,49 @@
+"""Measure opening a large local CSV archive through the memory mapped source: the first load that finds
+the rows, later loads that reuse the saved index, reading rows and picking videos from it.
+
+Run from the repository root with ``python -m benchmarks.archive_sources --rows 2000000``"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from archive_sources import CsvFileSource, load_archive_config
+from fake_mastodon import synthetic_archive_csv
+from selection import VideoSelector
+
+def timed(label: str, function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    print(f"{label:<36} {(time.perf_counter() - started) * 1000:>10.1f}ms")
+
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "archive.csv")
+
+        with open(path, "wb") as file:
+            file.write(synthetic_archive_csv(args.rows))
+
+        print(f"{args.rows:,} rows, {os.path.getsize(path) / 1_000_000:.0f} MB")
+
+        source = CsvFileSource(path, load_archive_config(os.path.join(directory, "archive.json")) | {"source": path})
+
+        timed("First load (finds and indexes rows)", source.load)
+        archive = timed("Load with the saved index", source.load)
+
+        indices = [random.randrange(len(archive)) for _ in range(10_000)]
+        timed("10,000 random rows", lambda: [archive[i] for i in indices])
+
+        selector = timed("VideoSelector without weights", VideoSelector, archive)
+        picks = timed("choose(300)", selector.choose, 300)
+
+        assert len({video.title for video in picks}) == 300, "a video repeated within the no-repeat window"
+
+if __name__ == "__main__":
+    main()
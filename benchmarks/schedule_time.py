@@ -0,0 +1,88 @@
+"""Measure generating years of daily slots in every pytz timezone, and check on random cases
+that each slot is what pytz's localize + normalize gives and keeps its wall clock time across DST.
+
+Run from the repository root with ``python -m benchmarks.schedule_time --years 5``"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+import pytz
+from schedule_time import daily_slots, get_zone, localize_series
+
+def reference_slots(start: datetime, count: int, timezone: str):
+    """One localize call per slot, the straightforward way"""
+    zone = pytz.timezone(timezone)
+    local_start = start.astimezone(zone).replace(tzinfo=None)
+
+    return [zone.normalize(zone.localize(local_start + timedelta(days=i))) for i in range(count)]
+
+def exists(zone, local: datetime):
+    try:
+        zone.localize(local, is_dst=None)
+    except pytz.NonExistentTimeError:
+        return False
+    except pytz.AmbiguousTimeError:
+        pass
+
+    return True
+
+def check_properties(cases: int, seed: int):
+    """Random zones, start dates and times, with times around 1-3 AM being the ones clocks usually skip or repeat"""
+    rng = random.Random(seed)
+    checked = 0
+
+    for _ in range(cases):
+        timezone = rng.choice(pytz.all_timezones)
+        zone = get_zone(timezone)
+        local_start = datetime(rng.randint(1990, 2036), rng.randint(1, 12), rng.randint(1, 28), rng.choice((0, 1, 2, 3, rng.randint(0, 23))), rng.choice((0, 30, rng.randint(0, 59))))
+        locals_ = [local_start + timedelta(days=i) for i in range(rng.randint(1, 400))]
+
+        for local, slot in zip(locals_, localize_series(zone, locals_)):
+            expected = zone.normalize(zone.localize(local))
+
+            assert slot == expected and slot.utcoffset() == expected.utcoffset(), f"{timezone} {local}: got {slot}, pytz gives {expected}"
+            assert slot.replace(tzinfo=None) == local or not exists(zone, local), f"{timezone} {local}: wall clock moved to {slot}"
+            checked += 1
+
+    return checked
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--cases", type=int, default=2000, help="random cases for the property check")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    days = args.years * 365
+    start = datetime(2024, 1, 1, 12)
+    timezones = pytz.all_timezones
+
+    started = time.perf_counter()
+    starts = {timezone: get_zone(timezone).localize(start) for timezone in timezones}
+    print(f"Loaded {len(timezones)} timezones in {time.perf_counter() - started:.2f}s")
+
+    started = time.perf_counter()
+    total = sum(len(daily_slots(starts[timezone], days, timezone)) for timezone in timezones)
+    fast = time.perf_counter() - started
+    print(f"daily_slots          {total:,} slots in {fast:.2f}s ({total / fast:,.0f} slots/s)")
+
+    started = time.perf_counter()
+    total = sum(len(reference_slots(starts[timezone], days, timezone)) for timezone in timezones)
+    slow = time.perf_counter() - started
+    print(f"localize per slot    {total:,} slots in {slow:.2f}s ({total / slow:,.0f} slots/s)")
+
+    # How far the old way of adding days to a localized time drifts
+    eastern = get_zone("US/Eastern")
+    drifted = sum(
+        (starts["US/Eastern"] + timedelta(days=i)).astimezone(eastern).hour != 12
+        for i in range(days)
+    )
+    print(f"Adding timedelta(days=1) puts {drifted} of {days} US/Eastern noon slots at the wrong hour, daily_slots puts 0")
+
+    started = time.perf_counter()
+    checked = check_properties(args.cases, args.seed)
+    print(f"Property check passed for {checked:,} slots in {args.cases} random cases ({time.perf_counter() - started:.1f}s)")
+
+if __name__ == "__main__":
+    main()
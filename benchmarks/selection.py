@@ -0,0 +1,103 @@
+"""Measure draws/sec of the video selector and check that its draws follow the configured weights.
+
+Run from the repository root with ``python -m benchmarks.selection --videos 500000``"""
+
+import argparse
+import math
+import random
+import sys
+import time
+from collections import Counter
+from archive import Video
+from selection import VideoSelector
+
+def synthetic_archive(size: int, channels=500):
+    return [Video(str(2012 + i % 12), str(1 + i % 12), f"Video {i}", f"Channel {i % channels}", f"https://pony.tube/w/{i}") for i in range(size)]
+
+def rate(draw, seconds=1.0):
+    draws, started = 0, time.perf_counter()
+
+    while time.perf_counter() - started < seconds:
+        for _ in range(1000):
+            draw()
+
+        draws += 1000
+
+    return draws / (time.perf_counter() - started)
+
+def chi_square(observed: Counter, expected_weight: Counter):
+    """Pearson's chi-square statistic of the observed years against the expected weights and its critical value,
+    using the Wilson-Hilferty approximation for the 99.9th percentile so no scipy is needed"""
+    draws = sum(observed.values())
+    total_weight = sum(expected_weight.values())
+
+    statistic = sum((observed[year] - draws * weight / total_weight) ** 2 / (draws * weight / total_weight) for year, weight in expected_weight.items())
+    degrees = len(expected_weight) - 1
+    critical = degrees * (1 - 2 / (9 * degrees) + 3.09 * math.sqrt(2 / (9 * degrees))) ** 3
+
+    return statistic, critical
+
+def year_weights(selector: VideoSelector, videos=None):
+    """The total weight of each year's videos, optionally only counting the given videos"""
+    expected_weight = Counter()
+
+    for video, weight in zip(selector.archive, selector.weights):
+        if videos is None or video in videos:
+            expected_weight[video.year] += weight
+
+    return expected_weight
+
+def chi_square_check(selector: VideoSelector, draws: int):
+    """Whether the drawn years follow the weights"""
+    return chi_square(Counter(selector.draw().year for _ in range(draws)), year_weights(selector))
+
+def choose_check(selector: VideoSelector, draws: int):
+    """Whether the years picked by choose follow the weights of the videos left once the excluded ones are
+    filtered out"""
+    excluded = {video.alt_link for i, video in enumerate(selector.archive) if video.year != "2012" and i % 10}
+    eligible = {video for video in selector.archive if video.alt_link not in excluded}
+    picks = selector.choose(draws, excluded_links=excluded)
+
+    assert len(picks) == draws, "choose ran out of videos while some were eligible"
+    assert all(video in eligible for video in picks), "choose picked an excluded video"
+
+    return chi_square(Counter(video.year for video in picks), year_weights(selector, eligible))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--videos", type=int, default=500_000)
+    parser.add_argument("--draws", type=int, default=200_000, help="draws for the distribution check")
+    args = parser.parse_args()
+
+    random.seed(0)
+    archive = synthetic_archive(args.videos)
+
+    started = time.perf_counter()
+    selector = VideoSelector(archive, year_weights={"2012": 5, "2020": 0.5}, channel_weights={"Channel 0": 10}, no_repeat_window=300, channel_cap=5)
+    print(f"Built the sampling index for {args.videos} videos in {time.perf_counter() - started:.2f}s")
+
+    print(f"random.choice        {rate(lambda: random.choice(archive)):>12,.0f} draws/s")
+    print(f"VideoSelector.draw   {rate(selector.draw):>12,.0f} draws/s")
+
+    started = time.perf_counter()
+    picks = selector.choose(300)
+    print(f"VideoSelector.choose 300 no-repeat picks in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    assert len({video.title for video in picks}) == 300, "a video repeated within the no-repeat window"
+    assert max(Counter(video.channel for video in picks).values()) <= 5, "a channel went over its cap"
+
+    assert selector.choose(10, excluded_links={video.alt_link for video in archive[1:]}) == archive[:1] * 10, "choose picked an excluded video instead of repeating the only one left"
+    assert selector.choose(10, excluded_links={video.alt_link for video in archive}) == [], "choose picked an excluded video once none were left"
+
+    failed = False
+
+    for label, check, checked in (("drawn", chi_square_check, selector), ("chosen", choose_check, VideoSelector(archive, year_weights={"2012": 5, "2020": 0.5}, no_repeat_window=0))):
+        statistic, critical = check(checked, args.draws)
+        failed = failed or statistic >= critical
+        print(f"Chi-square of {label} years: {statistic:.1f} (critical value at p=0.001: {critical:.1f}) {'OK' if statistic < critical else 'FAILED'}")
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
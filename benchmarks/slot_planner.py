@@ -0,0 +1,39 @@
+"""Measure planning a calendar over years: generating its slots and finding the empty ones
+around a schedule that has every other slot taken.
+
+Run from the repository root with ``python -m benchmarks.slot_planner --years 3``"""
+
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+from schedule_plan import Calendar, empty_slots
+from schedule_time import get_zone
+
+CALENDARS = ["12:00", "09:00 13:00 18:00", "09:00 18:30 fri-mon", "09:00 18:00 mon-fri; 12:00 weekends", "0 */4 1-15 * 1-5"]
+
+def timed(label: str, function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    print(f"{label:<48} {(time.perf_counter() - started) * 1000:>8.1f}ms")
+
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--tz", default="US/Eastern")
+    args = parser.parse_args()
+
+    get_zone(args.tz) # pytz loads its zone files on first use, which isn't part of planning
+    start = datetime.now(timezone.utc)
+    end = start + timedelta(days=365 * args.years)
+
+    for spec in CALENDARS:
+        calendar = Calendar(spec)
+        slots = timed(f"{spec!r} slots", calendar.slots, start, end, args.tz)
+        empty = timed(f"  {len(slots):,} slots, every other one taken", empty_slots, slots, slots[::2])
+
+        assert empty == slots[1::2], "a taken slot was planned again or an empty one was missed"
+
+if __name__ == "__main__":
+    main()
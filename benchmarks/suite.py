@@ -0,0 +1,226 @@
+"""Time the scheduler's main paths end to end against a local fake Mastodon instance and archive server:
+startup, archive loading, scheduling a full 300 posts, re-rolling and removing posts and rendering the schedule.
+
+Every repeat runs in a fresh temporary directory against a fresh server, so the results only depend on the options.
+Save a run with --save and check a later one against it with --compare to catch regressions,
+and --startup-target fails the run when the window takes longer than that to become usable.
+Opening the window needs a display, on a server run the suite under ``xvfb-run``.
+
+Run from the repository root with ``python -m benchmarks.suite --archive-rows 20000 --latency 0.02``"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from fake_mastodon import FakeMastodonServer
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MAX_SCHEDULED = 300
+STARTUP_TARGET = 2.0 # seconds from starting the window until it responds to input
+
+@contextlib.contextmanager
+def workspace():
+    """Run in an empty directory so no cache, history or journal carries over"""
+    previous = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+
+        try:
+            yield directory
+        finally:
+            os.chdir(previous)
+
+@contextlib.contextmanager
+def serving(args, **options):
+    server = FakeMastodonServer(
+        rate_limit=args.rate_limit, latency=args.latency, archive_rows=args.archive_rows, **options
+    ).start()
+
+    try:
+        yield server
+    finally:
+        server.stop()
+
+def timed(function, *args, **kwargs):
+    # The scheduler prints a line per post, which would only slow the run down and bury the results
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        function(*args, **kwargs)
+
+    return time.perf_counter() - started
+
+def environment(server):
+    return os.environ | {
+        "instance_url": server.url, "access_token": "benchmark",
+        "archive_url": server.url + "/archive.csv", "PYTHONPATH": REPO
+    }
+
+def use_server(server):
+    """Point the scheduler in this process at server, dropping the archive and accounts of the previous repeat"""
+    import core
+    from accounts import Account
+
+    os.environ["archive_url"] = server.url + "/archive.csv"
+    core.archive = core.selector = core.accounts = None
+
+    return core, Account(server.url, "benchmark")
+
+def fill_schedule(server, count=MAX_SCHEDULED):
+    """Put count scheduled posts straight into the fake instance, a day apart"""
+    from archive import Video
+    from templates import get_template
+
+    template = get_template()
+    start = datetime.now(timezone.utc) + timedelta(days=1)
+
+    for i in range(count):
+        video = Video(str(2012 + i % 12), str(1 + i % 12), f"Video {i}", f"Channel {i % 50}", f"https://pony.tube/w/{i}")
+        server.state.schedule_status(template.render(video), "public", start + timedelta(days=i))
+
+def bench_startup(args):
+    """Start the command line until the schedule is fetched, and open the window until it shows the schedule"""
+    results = {}
+
+    with workspace(), serving(args) as server:
+        started = time.perf_counter()
+        subprocess.run(
+            [sys.executable, os.path.join(REPO, "scheduler.py"), "schedule", "--days", "1", "--tz", "UTC", "--dry-run"],
+            env=environment(server), check=True, capture_output=True
+        )
+        results["startup_headless"] = time.perf_counter() - started
+
+        fill_schedule(server)
+        probe = subprocess.run(
+            [sys.executable, "-m", "benchmarks.window_probe", str(time.time())],
+            env=environment(server), capture_output=True, text=True
+        )
+
+        if probe.returncode == 0:
+            results |= json.loads(probe.stdout.splitlines()[-1])
+        elif not getattr(bench_startup, "warned", False):
+            bench_startup.warned = True
+            print(f"Skipping the window benchmarks: {(probe.stderr.strip().splitlines() or ['no output'])[-1]}", file=sys.stderr)
+
+    return results
+
+def bench_archive(args):
+    from archive import ArchiveCache, load_archive
+
+    with workspace(), serving(args) as server:
+        use_server(server)
+        cache = ArchiveCache()
+
+        return {
+            "archive_download": timed(load_archive, cache=cache),
+            "archive_cached": timed(load_archive, cache=cache)
+        }
+
+def bench_scheduling(args):
+    """Schedule a full 300 posts, then page through them and re-roll and remove some"""
+    with workspace(), serving(args) as server:
+        core, account = use_server(server)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            core.fetch_archive() # the download is measured on its own
+
+        start = datetime.now(timezone.utc) + timedelta(days=1)
+        results = {"bulk_300": timed(core.bulk_post_to_mastodon, MAX_SCHEDULED, start, "UTC", account=account)}
+
+        started = time.perf_counter()
+        scheduled = list(core.fetch_schedule(account))
+        results["fetch_schedule_300"] = time.perf_counter() - started
+
+        assert len(scheduled) == MAX_SCHEDULED, f"{len(scheduled)} posts were scheduled instead of {MAX_SCHEDULED}"
+
+        results["reroll_1"] = timed(core.reroll_posts, scheduled[:1], scheduled, account=account)
+        scheduled = list(core.fetch_schedule(account))
+        results["reroll_10"] = timed(core.reroll_posts, scheduled[10:20], scheduled, account=account)
+        results["remove_1"] = timed(core.delete_scheduled_post, scheduled[-1].post_id, account)
+
+        return results
+
+BENCHMARKS = {"startup": bench_startup, "archive": bench_archive, "scheduling": bench_scheduling}
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """Print each result next to the baseline, returning the names of the ones that got slower than the tolerance allows"""
+    regressions = []
+
+    for name, seconds in results.items():
+        line = f"{name:<22} {seconds * 1000:>10.1f}ms"
+
+        if name in baseline:
+            ratio = seconds / baseline[name]
+            line += f"  baseline {baseline[name] * 1000:>10.1f}ms  {ratio:>5.2f}x"
+
+            if ratio > 1 + tolerance:
+                regressions.append(name)
+                line += "  REGRESSION"
+
+        print(line)
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", choices=BENCHMARKS, action="append", help="run only these benchmarks, can be given more than once")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of every benchmark, the median is reported")
+    parser.add_argument("--archive-rows", type=int, default=20_000, help="rows in the synthetic archive")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the fake instance delays every response by")
+    parser.add_argument("--rate-limit", type=int, default=100_000, help="requests per 5 minutes the fake instance allows, high enough by default to measure the client instead of the limit")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare against results saved with --save, exiting with 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="how much slower than the baseline still passes, 0.25 is 25%%")
+    parser.add_argument("--startup-target", type=float, default=STARTUP_TARGET, help=f"seconds the window may take to respond to input, defaults to {STARTUP_TARGET}")
+    args = parser.parse_args()
+
+    runs = {}
+
+    for name in args.only or BENCHMARKS:
+        for _ in range(args.repeat):
+            for result, seconds in BENCHMARKS[name](args).items():
+                runs.setdefault(result, []).append(seconds)
+
+    results = {name: statistics.median(times) for name, times in runs.items()}
+    options = {"archive_rows": args.archive_rows, "latency": args.latency, "rate_limit": args.rate_limit, "repeat": args.repeat}
+
+    print(f"Median of {args.repeat} runs, {args.archive_rows:,} archive rows, {args.latency * 1000:.0f}ms latency")
+
+    baseline = {}
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            saved = json.load(file)
+
+        if saved["options"] != options:
+            print(f"The baseline was run with different options: {saved['options']}", file=sys.stderr)
+
+        baseline = saved["results"]
+
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump({"options": options, "results": results}, file, indent=2)
+
+    too_slow = results.get("window_interactive", 0) > args.startup_target
+
+    if too_slow:
+        print(f"The window took {results['window_interactive']:.2f}s to respond, more than the {args.startup_target}s target", file=sys.stderr)
+
+    if regressions:
+        print(f"Slower than the baseline by more than {args.tolerance:.0%}: {', '.join(regressions)}", file=sys.stderr)
+
+    if regressions or too_slow:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
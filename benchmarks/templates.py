@@ -0,0 +1,60 @@
+"""Measure rendering post messages with the compiled template against building them one f-string at a time,
+and check that every message parses back to its video.
+
+Run from the repository root with ``python -m benchmarks.templates --messages 100000``"""
+
+import argparse
+import calendar
+import time
+from archive import Video
+from templates import DEFAULT_TEMPLATE, MessageTemplate
+
+def synthetic_archive(size: int):
+    # Every 10th title has quotes in it, which splitting on quotes used to get wrong
+    return [
+        Video(str(2012 + i % 12), str(1 + i % 12), f'Video "{i}" from "somewhere"' if i % 10 == 0 else f"Video {i}", f"Channel {i % 500}", f"https://pony.tube/w/{i}")
+        for i in range(size)
+    ]
+
+def create_post_message(video: Video):
+    """How messages were built before templates"""
+    month_name = calendar.month_name[int(video.month)]
+
+    return f'The randomly selected top pony video of the day is: "{video.title}" from "{video.channel}" from {month_name} {video.year}:\n{video.alt_link}'
+
+def split_title(message: str):
+    """How titles were parsed back before templates"""
+    return message.split(": \"", 1)[1].split("\" from \"" ,1)[0]
+
+def timed(label: str, function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    print(f"{label:<28} {(time.perf_counter() - started) * 1000:>8.1f}ms")
+
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    args = parser.parse_args()
+
+    videos = synthetic_archive(args.messages)
+
+    template = timed("Compiling the template", MessageTemplate, DEFAULT_TEMPLATE)
+    old_messages = timed("f-string per message", lambda: [create_post_message(video) for video in videos])
+    messages = timed("MessageTemplate.render_all", template.render_all, videos)
+
+    assert messages == old_messages, "the default template renders differently from the old messages"
+
+    parsed = timed("MessageTemplate.parse", lambda: [template.parse(message) for message in messages])
+    split = timed("Splitting on quotes", lambda: [split_title(message) for message in messages])
+
+    parse_errors = sum(fields["title"] != video.title or fields["alt_link"] != video.alt_link for fields, video in zip(parsed, videos))
+    split_errors = sum(title != video.title for title, video in zip(split, videos))
+
+    print(f"Titles parsed back wrong: {parse_errors} with the template, {split_errors} by splitting on quotes")
+
+    assert parse_errors == 0, "a message didn't parse back to its video"
+
+if __name__ == "__main__":
+    main()
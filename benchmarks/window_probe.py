@@ -0,0 +1,53 @@
+"""Started by the benchmark suite to open the real window against the fake instance. Prints one JSON line
+with how long it took from the suite starting this process until the window was drawn and until it showed
+the schedule from the instance, how long rendering that schedule again takes and the window's own
+startup phase timings, which count from its first import instead of the process starting.
+
+Needs a display, exits with an error without one"""
+
+import json
+import statistics
+import sys
+import time
+import tkinter as tk
+
+TIMEOUT = 60 # seconds to wait for the schedule to load
+RENDERS = 20
+
+started = float(sys.argv[1]) # time.time() when the suite started the process
+results = {}
+
+def mainloop(self, n=0):
+    # Instead of running the window, draw it once and hand control back to the import below
+    self.update()
+    results["window_open"] = time.time() - started
+
+tk.Misc.mainloop = mainloop
+
+import gui
+
+while gui.reconciler is None: # created once the whole schedule came in
+    if time.time() - started > TIMEOUT:
+        sys.exit("The schedule didn't load in time")
+
+    gui.root.update()
+    time.sleep(0.005)
+
+results["window_schedule_loaded"] = time.time() - started
+
+from telemetry import startup_phases
+
+results |= {f"window_{phase}": seconds for phase, seconds in startup_phases.items()}
+
+renders = []
+
+for _ in range(RENDERS):
+    render_started = time.perf_counter()
+    gui.init_schedule_rows()
+    gui.root.update_idletasks()
+    renders.append(time.perf_counter() - render_started)
+
+results["render_schedule"] = statistics.median(renders)
+
+gui.root.destroy()
+print(json.dumps(results))
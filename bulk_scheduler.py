@@ -0,0 +1,134 @@
+import threading
+import time
+from datetime import datetime, timezone
+from telemetry import operations, timed
+
+# Mastodon's default budget is 300 requests per 5 minutes, used until the first response tells us otherwise
+DEFAULT_LIMIT = 300
+DEFAULT_PERIOD = 300
+
+MAX_BACKOFF = 5 * 60
+
+class TokenBucket:
+    """Thread safe token bucket that paces requests to the rate limit budget the instance reports.
+
+    Until the first response it refills steadily at the default budget. After that it follows the instance's
+    fixed window: only the remaining requests are handed out until the window resets, then the whole limit"""
+
+    def __init__(self, capacity: int = DEFAULT_LIMIT, period: float = DEFAULT_PERIOD):
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.rate = capacity / period # tokens regained per second
+        self.window_reset = 0.0
+        self.blocked_until = 0.0
+        self.in_flight = 0 # requests handed out that haven't been answered yet
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        if self.window_reset:
+            if time.time() >= self.window_reset:
+                self.tokens = self.capacity
+                self.window_reset = 0.0 # the next response says when the new window ends
+        else:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+
+        self.updated = now
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.blocked_until - now
+
+                if wait <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        self.in_flight += 1
+                        return
+
+                    wait = self.window_reset - time.time() if self.window_reset else (1 - self.tokens) / self.rate
+
+            # The window can reset between the clock readings of _refill and the one above
+            time.sleep(max(0.0, wait))
+
+    def release(self):
+        """The request of an acquire was answered or failed"""
+        with self.lock:
+            self.in_flight -= 1
+
+    def headroom(self):
+        """Requests that could be sent right now, and the size of the budget"""
+        with self.lock:
+            self._refill(time.monotonic())
+            return self.tokens, self.capacity
+
+    def sync(self, remaining: int, limit: int, reset: float):
+        """Correct the bucket with the X-RateLimit-* values of the latest response.
+        reset is the epoch time at which the server refills the budget"""
+        if reset <= time.time():
+            return # no rate limit headers yet, or the window already passed
+
+        with self.lock:
+            self._refill(time.monotonic())
+
+            # Requests handed out but not answered yet aren't counted in remaining
+            available = max(0, remaining - self.in_flight)
+
+            if not self.window_reset:
+                # The first response of a window, the count so far was a guess or belongs to the last window
+                self.tokens = available
+                self.window_reset = reset
+            else:
+                # Responses arrive out of order when requests run concurrently, so the lower count of the two wins.
+                # Mastodon.py moves every reset by the response's Date header, so it shifts a little within a window
+                self.tokens = min(self.tokens, available)
+                self.window_reset = max(self.window_reset, reset)
+
+            self.capacity = limit
+
+    def backoff(self, reset: float, attempt: int):
+        """Stop handing out tokens after a 429 until the window resets,
+        or exponentially longer if the server didn't say when that is"""
+        with self.lock:
+            delay = reset - time.time() if reset > time.time() else 2 ** attempt
+            self.blocked_until = max(self.blocked_until, time.monotonic() + min(delay, MAX_BACKOFF))
+            self.tokens = 0
+
+def call_with_backoff(mastodon, bucket: TokenBucket, method, *args, max_attempts=5, **kwargs):
+    """Call a Mastodon.py method once the bucket allows it, retrying on 429s.
+    The client needs to be created with ratelimit_method="throw" so that 429s reach this function"""
+    from mastodon import MastodonRatelimitError # only loaded once there's a client to call anyway
+
+    for attempt in range(max_attempts):
+        started = time.perf_counter()
+        bucket.acquire()
+        operations.observe("rate_limit_wait", time.perf_counter() - started, "ok")
+
+        try:
+            with timed(method.__name__):
+                result = method(*args, **kwargs)
+        except MastodonRatelimitError:
+            if attempt + 1 == max_attempts:
+                raise
+
+            bucket.backoff(mastodon.ratelimit_reset, attempt)
+            continue
+        finally:
+            bucket.release()
+
+        bucket.sync(mastodon.ratelimit_remaining, mastodon.ratelimit_limit, mastodon.ratelimit_reset)
+        return result
+
+def schedule_post(mastodon, bucket: TokenBucket, message: str, scheduled_time_utc: int, idempotency_key: str = None):
+    """Schedule a post, returning its id. The instance creates only one post
+    per idempotency key, so a retried request with the same key is safe"""
+    scheduled_time = datetime.fromtimestamp(scheduled_time_utc, tz=timezone.utc)
+    response = call_with_backoff(
+        mastodon, bucket, mastodon.status_post, message,
+        scheduled_at=scheduled_time, visibility='public', idempotency_key=idempotency_key
+    )
+
+    return response.id
@@ -0,0 +1,79 @@
+"""The one HTTP layer every request to the instance and the archive goes through.
+
+A shared keep-alive session with connect/read timeouts, jittered retries for requests
+that are safe to repeat, and latency/error histograms per endpoint"""
+
+import re
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from telemetry import Metrics
+
+CONNECT_TIMEOUT = 5 # seconds
+READ_TIMEOUT = 30
+TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+POOL_SIZE = 8 # matches the most requests bulk scheduling has in flight at once
+POOL_HOSTS = 16 # hosts to keep pools for, one per instance scheduled for plus the archive
+MAX_RETRIES = 3
+
+# Requests that can be repeated without doing something twice. POSTs are only retried
+# when the connection failed, since the request never reached the server then
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+# 429s aren't retried here, the token bucket deals with those
+RETRY_STATUSES = (500, 502, 503, 504)
+
+metrics = Metrics()
+
+def endpoint_name(request) -> str:
+    """Group requests by method, host and path, with ids in the path left out"""
+    url = requests.utils.urlparse(request.url)
+    path = re.sub(r"/\d+(?=/|$)", "/:id", url.path.rstrip("/"))
+
+    return f"{request.method} {url.hostname}{path}"
+
+class InstrumentedAdapter(HTTPAdapter):
+    """HTTPAdapter that applies the default timeouts and records every request in metrics.
+    For streamed responses the latency is the time until the headers arrived"""
+
+    def send(self, request, timeout=None, **kwargs):
+        started = time.perf_counter()
+        outcome = "error"
+
+        try:
+            response = super().send(request, timeout=timeout or TIMEOUT, **kwargs)
+            outcome = str(response.status_code)
+            return response
+        except requests.RequestException as e:
+            outcome = type(e).__name__
+            raise
+        finally:
+            metrics.observe(endpoint_name(request), time.perf_counter() - started, outcome)
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """Return the shared session, creating it on first use"""
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            retries = Retry(
+                total=MAX_RETRIES,
+                backoff_factor=0.5,
+                backoff_jitter=0.5, # keeps concurrent retries from hitting the instance at the same moment
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=IDEMPOTENT_METHODS,
+                raise_on_status=False # the last response is handed back so the caller sees the real error
+            )
+            adapter = InstrumentedAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_SIZE, max_retries=retries)
+
+            _session = requests.Session()
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+
+        return _session
@@ -0,0 +1,348 @@
+"""Scheduling logic shared by the GUI and the headless command line.
+
+Nothing in here touches tkinter, and the Mastodon client, pytz and the archive
+are only imported or loaded the first time something needs them"""
+
+import os # dot environment variables
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta #time stuff
+from dotenv import load_dotenv #dot environment variables
+from accounts import Account, load_accounts
+from archive import load_archive
+from batch import JOURNAL_PATH, MIN_LEAD_TIME, BatchJournal, gap_slots, reroll_candidates, run_batch
+from bulk_scheduler import call_with_backoff
+from history import PostHistory
+from outbox import Outbox, OutboxSender, entry_time, send_outbox
+from schedule_model import Schedule, ScheduledPost
+from schedule_plan import Calendar, empty_slots
+from schedule_time import daily_slots, next_slot
+from templates import get_template
+from selection import VideoSelector, load_selection_config
+from schedule_store import Reconciler, iter_scheduled_pages
+from telemetry import timed
+
+load_dotenv()
+
+# Retrieve environment variables
+instance_url = os.getenv("instance_url")
+access_token = os.getenv("access_token")
+
+# Mastodon only allows 300 scheduled posts per account
+MAX_SCHEDULED_POSTS = 300
+
+# The archive and the selector built from it are shared by every account
+archive = None
+selector = None
+archive_lock = threading.Lock()
+
+# The account from .env, used whenever no account is given
+default_account = Account(instance_url, access_token)
+
+# Loaded once so every caller shares each account's client and rate limit budget
+accounts = None
+
+# The background sender of each account's outbox, started by start_sender
+senders = {}
+
+def get_accounts() -> list[Account]:
+    """The accounts from accounts.json, or just the one from .env if there's no such file"""
+    global accounts
+
+    if accounts is None:
+        accounts = load_accounts() or [default_account]
+
+    return accounts
+
+def get_account(name: str = None) -> Account:
+    if name is None:
+        return default_account
+
+    for account in get_accounts():
+        if account.name == name:
+            return account
+
+    raise ValueError(f"No account named {name!r} in accounts.json")
+
+def get_mastodon(account: Account = None):
+    """Return the account's Mastodon client, creating it on first use"""
+    return (account or default_account).get_mastodon()
+
+def for_each_account(accounts: list[Account], function, *args, **kwargs):
+    """Call function(account, *args, **kwargs) for every account at once. Each account has its own
+    rate limit budget, so one instance being slow or limited doesn't hold up the others.
+    Returns a dict of account to its result, or the exception it raised"""
+    results = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, len(accounts))) as executor:
+        futures = {account: executor.submit(function, account, *args, **kwargs) for account in accounts}
+
+        for account, future in futures.items():
+            results[account] = future.exception() or future.result()
+
+    return results
+
+def check_connection(account: Account = None):
+    """Whether the instance can be reached. Mastodon.py reports version 1.0.0 whenever the version request
+    fails for any reason, so the underlying error is only seen with fail_hard"""
+    from mastodon import MastodonError
+
+    account = account or default_account
+
+    try:
+        get_mastodon(account).retrieve_mastodon_version(fail_hard=True)
+    except MastodonError as e:
+        print("\033[93m", f"Couldn't reach {account.instance_url}: {e.__cause__ or e}", "\033[00m")
+        return False
+
+    return True
+
+def fetch_archive():
+    """Initialize the global 'archive' variable with the archive rows, served from the local cache when possible"""
+    global archive
+
+    def on_refresh(rows):
+        global archive
+
+        if rows:
+            archive = rows
+
+    with timed("fetch_archive"):
+        archive = load_archive(on_refresh)
+
+    if not archive:
+        raise ValueError("No eligible videos found in the archive")
+
+def get_selector() -> VideoSelector:
+    """Return the video selector for the current archive, building its sampling index once per archive load"""
+    global selector
+
+    # Accounts scheduling at the same time share the one download and index
+    with archive_lock:
+        if not archive:
+            fetch_archive()
+
+        if selector is None or selector.archive is not archive:
+            selector = VideoSelector(archive, **load_selection_config())
+
+        return selector
+
+def get_history(account: Account = None) -> PostHistory:
+    return (account or default_account).get_history()
+
+def sync_history(account: Account = None):
+    """Add the account's newly published posts to the post history"""
+    account = account or default_account
+    return account.get_history().sync_published(account.get_mastodon(), account.bucket)
+
+def choose_videos(count: int, recent_titles=(), before: datetime = None, account: Account = None):
+    """Pick count videos to post after the recently posted or scheduled titles,
+    also avoiding what the post history says was featured before the given time"""
+    selector = get_selector()
+
+    # The scheduled titles are usually in the history too, so they're only counted once
+    recent_titles = list(recent_titles)
+    scheduled_titles = set(recent_titles)
+    history_titles = get_history(account).recent_titles(selector.no_repeat_window, before) if selector.no_repeat_window else []
+
+    recent_titles = [title for title in history_titles if title not in scheduled_titles] + recent_titles
+    excluded_links = get_history(account).links_since(datetime.now() - timedelta(days=selector.no_repeat_days)) if selector.no_repeat_days else frozenset()
+
+    videos = selector.choose(count, recent_titles, excluded_links)
+
+    if len(videos) < count:
+        print("\033[93m", f"Only {len(videos)} of {count} videos could be picked, every video was featured within the last {selector.no_repeat_days} days", "\033[00m")
+
+    return videos
+
+def delete_scheduled_post(post_id, account: Account = None):
+    account = account or default_account
+    mastodon = account.get_mastodon()
+    call_with_backoff(mastodon, account.bucket, mastodon.scheduled_status_delete, post_id)
+
+def get_outbox(account: Account = None) -> Outbox:
+    return (account or default_account).get_outbox()
+
+def planned_schedule(schedule: Schedule, account: Account = None) -> Schedule:
+    """The schedule with the posts still waiting in the outbox added, by their idempotency keys"""
+    planned = Schedule(schedule)
+
+    for entry in get_outbox(account).queued():
+        planned.add(ScheduledPost(entry["title"], entry["key"], entry_time(entry)))
+
+    return planned
+
+def history_callbacks(account: Account, on_sent=None):
+    """on_sent and on_failed for send_outbox that keep the post history in step with the outbox.
+    Sent posts get the id the instance gave them, and posts that are given up on no longer count as featured"""
+    history = account.get_history()
+
+    def post_sent(entry, post_id):
+        history.sent(entry["key"], post_id)
+
+        if on_sent:
+            on_sent(entry, post_id)
+
+    return post_sent, lambda entry: history.forget(entry["key"])
+
+def send_queued(account: Account = None, on_sent=None):
+    """Send the account's due posts from the outbox, returning how many were sent. on_sent(entry, post_id)
+    is called as each one is, see outbox.Outbox for what an entry holds"""
+    account = account or default_account
+    label = f"[{account.name}] " if account.name else ""
+
+    def post_sent(entry, post_id):
+        if on_sent:
+            on_sent(entry, post_id)
+
+        print(f'{label}"{entry["title"]}" scheduled on Mastodon for {entry_time(entry):%Y-%m-%d %H:%M}.')
+
+    return send_outbox(get_outbox(account), account.get_mastodon(), account.bucket, *history_callbacks(account, post_sent))
+
+def start_sender(account: Account = None, on_sent=None) -> OutboxSender:
+    """Keep sending the account's queued posts in the background as they become due, once per account"""
+    account = account or default_account
+
+    if account not in senders:
+        senders[account] = OutboxSender(get_outbox(account), account, *history_callbacks(account, on_sent)).start()
+
+    return senders[account]
+
+def bulk_post_to_mastodon(num_posts, scheduled_time: datetime, timezone: str, on_scheduled=None, recent_titles=(), account: Account = None, send=True):
+    """Schedule a random video a day for num_posts days starting at scheduled_time, at the same wall clock time
+    in the given timezone, avoiding repeats of recent_titles. See schedule_slots for the rest"""
+    return schedule_slots(daily_slots(scheduled_time, num_posts, timezone), on_scheduled, recent_titles, account, send)
+
+def room_left(schedule: Schedule) -> int:
+    """How many more posts the instance allows to be scheduled, schedule including the queued ones"""
+    return max(0, MAX_SCHEDULED_POSTS - len(schedule))
+
+def plan_calendar(calendar: Calendar, schedule: Schedule, timezone: str, end: datetime, now: datetime = None) -> list[datetime]:
+    """The empty slots of the calendar from now until end, earliest first and only as many as there's room for.
+    schedule should include the queued posts, see planned_schedule"""
+    start = (now or datetime.now().astimezone()) + MIN_LEAD_TIME
+    slots = empty_slots(calendar.slots(start, end, timezone), [post.scheduled_time for post in schedule])
+
+    return slots[:room_left(schedule)]
+
+def schedule_slots(times: list[datetime], on_scheduled=None, recent_titles=(), account: Account = None, send=True):
+    """Schedule a random video at each of the given increasing times, avoiding repeats of recent_titles.
+
+    The posts are queued in the account's outbox before anything is sent, so the ones that couldn't be sent
+    are sent later instead of being lost, and with send=False they're only planned.
+    on_scheduled(video, post_id, scheduled_time) is called in order as each post is scheduled.
+    Returns how many posts are still waiting in the outbox"""
+
+    if not times:
+        return len(get_outbox(account).queued())
+
+    account = account or default_account
+    videos = choose_videos(len(times), recent_titles, times[0], account)
+    outbox = get_outbox(account)
+
+    keys = outbox.add(zip(get_template().render_all(videos), times, videos))
+    planned = {key: i for i, key in enumerate(keys)}
+
+    # Recorded right away so the next plan doesn't pick the same videos while these are still queued,
+    # under their idempotency keys until they're sent, see history_callbacks
+    get_history(account).record((video.title, video.alt_link, time, key) for video, time, key in zip(videos, times, keys))
+
+    def post_sent(entry, post_id):
+        if on_scheduled and entry["key"] in planned:
+            i = planned[entry["key"]]
+            on_scheduled(videos[i], post_id, times[i])
+
+    if send:
+        send_queued(account, post_sent)
+
+    waiting = len(outbox.queued())
+
+    if waiting:
+        label = f"[{account.name}] " if account.name else ""
+        print("\033[93m", f"{label}{waiting} posts are waiting in the outbox, they're sent once the instance can be reached", "\033[00m")
+
+    return waiting
+
+def run_journal(journal: BatchJournal, scheduled_count: int, on_done=None, account: Account = None):
+    """Finish the journal's pending slots, recording each new post in the history"""
+    new_slots = sum(1 for entry in journal.pending() if entry["old_id"] is None and entry["new_id"] is None)
+
+    account = account or default_account
+
+    def slot_done(entry):
+        account.get_history().record([(entry["title"], entry["alt_link"], datetime.fromisoformat(entry["time"]), entry["new_id"])])
+
+        if on_done:
+            on_done(entry)
+
+        print(f'Filled the slot at {entry["time"][:16]} with "{entry["title"]}"')
+
+    headroom = MAX_SCHEDULED_POSTS - scheduled_count - new_slots
+    run_batch(account.get_mastodon(), account.bucket, journal, slot_done, headroom)
+
+def get_journal(account: Account = None) -> BatchJournal:
+    return BatchJournal((account or default_account).file_path(JOURNAL_PATH))
+
+def reroll_posts(posts, scheduled, on_done=None, account: Account = None):
+    """Replace the given scheduled posts with newly picked videos at the same times.
+    scheduled is every currently scheduled post. on_done(entry) is called from a worker thread
+    as each slot is done, see batch.BatchJournal for what an entry holds"""
+    posts = reroll_candidates(posts, datetime.now().astimezone())
+    rerolled = {post.post_id for post in posts}
+
+    if not posts:
+        return
+
+    videos = choose_videos(len(posts), [post.title for post in scheduled if post.post_id not in rerolled], posts[0].scheduled_time, account)
+    journal = get_journal(account)
+
+    for post, video, message in zip(posts, videos, get_template().render_all(videos)):
+        journal.add(post.scheduled_time, video, message, post.post_id)
+
+    journal.save()
+    run_journal(journal, len(scheduled), on_done, account)
+
+def fill_gaps(gaps, scheduled, timezone: str, on_done=None, account: Account = None):
+    """Schedule a post for every empty day in the given schedule_model.Gaps, at the time of day
+    of the post after each gap. on_done is called like in reroll_posts"""
+    slots = [slot for gap in gaps for slot in gap_slots(gap, timezone, datetime.now().astimezone())]
+    slots = slots[:room_left(planned_schedule(Schedule(scheduled), account))]
+
+    if not slots:
+        return
+
+    videos = choose_videos(len(slots), [post.title for post in scheduled], slots[0], account)
+    journal = get_journal(account)
+
+    for slot, video, message in zip(slots, videos, get_template().render_all(videos)):
+        journal.add(slot, video, message)
+
+    journal.save()
+    run_journal(journal, len(scheduled), on_done, account)
+
+def resume_batch(scheduled_count: int, on_done=None, account: Account = None):
+    """Finish a re-roll or gap fill that was interrupted, if there is one"""
+    journal = get_journal(account)
+
+    if journal.pending():
+        print(f"Resuming an interrupted batch with {len(journal.pending())} slots left")
+        run_journal(journal, scheduled_count, on_done, account)
+
+def has_pending_batch(account: Account = None):
+    return bool(get_journal(account).pending())
+
+def next_scheduled_time(latest_scheduled_time: datetime | None, hour: int, minute: int, timezone: str):
+    """Get the next time that a video should be scheduled at the given
+    24 hour time, determined by the latest currently scheduled post if any"""
+    return next_slot(latest_scheduled_time, hour, minute, timezone)
+
+@timed("fetch_schedule")
+def fetch_schedule(account: Account = None):
+    """All of the account's scheduled posts"""
+    account = account or default_account
+    return Schedule(post for page in iter_scheduled_pages(account.get_mastodon(), account.bucket) for post in page)
+
+def make_reconciler(posts, account: Account = None):
+    """A Reconciler that starts from posts, a full listing of the schedule"""
+    account = account or default_account
+    return Reconciler(account.get_mastodon(), account.bucket, posts)
@@ -0,0 +1,349 @@
+"""Local stand-in for a Mastodon instance so scheduling can be exercised without a network or a real account.
+
+It can also serve a synthetic video archive at /archive.csv in place of the Google Sheet export.
+
+Run it with ``python fake_mastodon.py --port 8000 --archive-rows 20000`` and point ``instance_url``
+at ``http://127.0.0.1:8000`` and ``archive_url`` at ``http://127.0.0.1:8000/archive.csv``"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+MIN_SCHEDULE_DELAY = timedelta(minutes=5) # same restriction as real instances
+MAX_SCHEDULED = 300
+
+ARCHIVE_HEADER = ["Year", "Month", "Rank", "Link", "Title", "Channel", "Upload date", "State", "Alternate link"]
+ACCOUNT = {"id": "1", "username": "fake", "acct": "fake", "display_name": "Fake account"}
+
+def format_time(time: datetime):
+    return time.astimezone(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+def synthetic_archive_csv(rows: int, channels=2000, seed=0) -> bytes:
+    """An archive export with the sheet's columns, about 1% of it blacklisted, the same for the same arguments"""
+    rng = random.Random(seed)
+    file = io.StringIO()
+    writer = csv.writer(file)
+    writer.writerow(ARCHIVE_HEADER)
+
+    for i in range(rows):
+        channel = f"Channel {rng.randrange(channels)}" + (" [BLACKLIST]" if rng.random() < 0.01 else "")
+        writer.writerow([
+            2012 + i % 12, 1 + i % 12, 1 + i % 10, f"https://youtu.be/{i:011d}", f'Video "{i}", part {i % 7}',
+            channel, "2020-01-01", "", f"https://pony.tube/w/{i:011d}"
+        ])
+
+    return file.getvalue().encode()
+
+class FakeMastodon:
+    """In-memory instance state shared by all request handlers"""
+
+    def __init__(self, rate_limit=300, rate_period=300, latency=0.0, archive_rows=0, published=0):
+        self.rate_limit = rate_limit
+        self.rate_period = rate_period
+        self.latency = latency # seconds added to every response
+
+        self.scheduled: dict[int, dict] = {}
+        self.statuses: dict[int, dict] = {} # published
+        self.idempotency_keys: dict[str, dict] = {}
+        self.next_id = 1
+
+        self.archive = synthetic_archive_csv(archive_rows) if archive_rows else None
+        self.archive_etag = self.archive and '"' + hashlib.sha256(self.archive).hexdigest()[:16] + '"'
+
+        self.window_start = time.time()
+        self.window_used = 0
+
+        # Stats for checking throughput and limit compliance
+        self.request_count = 0
+        self.throttled_count = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        self.lock = threading.Lock()
+
+        for i in range(published):
+            self.publish(f"Published post {i}", datetime.now(timezone.utc) - timedelta(days=published - i))
+
+    def take_request(self):
+        """Count a request against the rate limit window. Returns (allowed, remaining, reset)"""
+        with self.lock:
+            now = time.time()
+
+            if now - self.window_start >= self.rate_period:
+                self.window_start = now
+                self.window_used = 0
+
+            self.request_count += 1
+            allowed = self.window_used < self.rate_limit
+
+            if allowed:
+                self.window_used += 1
+            else:
+                self.throttled_count += 1
+
+            return allowed, self.rate_limit - self.window_used, self.window_start + self.rate_period
+
+    def schedule_status(self, text: str, visibility: str, scheduled_at: datetime, idempotency_key: str = None):
+        """The new scheduled status, the one created earlier with the same idempotency key,
+        or None if the account already has as many scheduled statuses as it's allowed"""
+        with self.lock:
+            if idempotency_key in self.idempotency_keys:
+                return self.idempotency_keys[idempotency_key]
+
+            if len(self.scheduled) >= MAX_SCHEDULED:
+                return None
+
+            status = {
+                "id": str(self.next_id),
+                "scheduled_at": format_time(scheduled_at),
+                "params": {"text": text, "visibility": visibility},
+                "media_attachments": []
+            }
+            self.scheduled[self.next_id] = status
+            self.next_id += 1
+
+            if idempotency_key:
+                self.idempotency_keys[idempotency_key] = status
+
+        return status
+
+    def publish(self, text: str, created_at: datetime):
+        with self.lock:
+            status = {
+                "id": str(self.next_id),
+                "created_at": format_time(created_at),
+                "content": "<p>" + text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace("\n", "<br>") + "</p>",
+                "visibility": "public",
+                "account": ACCOUNT,
+                "in_reply_to_id": None,
+                "reblog": None,
+                "media_attachments": []
+            }
+            self.statuses[self.next_id] = status
+            self.next_id += 1
+
+        return status
+
+    def publish_due(self):
+        """Publish the scheduled statuses whose time came, like the instance's scheduler does"""
+        now = format_time(datetime.now(timezone.utc))
+
+        with self.lock:
+            due = [id for id, status in self.scheduled.items() if status["scheduled_at"] <= now]
+            posts = [self.scheduled.pop(id) for id in due]
+
+        for post in posts:
+            self.publish(post["params"]["text"], datetime.fromisoformat(post["scheduled_at"].replace("Z", "+00:00")))
+
+    def delete_scheduled(self, id: int):
+        with self.lock:
+            return self.scheduled.pop(id, None) is not None
+
+    def scheduled_page(self, limit: int, max_id: int = None, min_id: int = None, since_id: int = None):
+        """Newest first page of scheduled statuses, like the real endpoint"""
+        self.publish_due()
+        return self.page(self.scheduled, limit, max_id, min_id, since_id)
+
+    def page(self, items: dict, limit: int, max_id: int = None, min_id: int = None, since_id: int = None):
+        with self.lock:
+            ids = sorted(items, reverse=True)
+
+        if max_id is not None:
+            ids = [id for id in ids if id < max_id]
+        if since_id is not None:
+            ids = [id for id in ids if id > since_id]
+        if min_id is not None:
+            # min_id pages start right after the cursor instead of at the newest status
+            ids = [id for id in ids if id > min_id][-limit:]
+
+        return [items[id] for id in ids[:limit] if id in items]
+
+class FakeMastodonHandler(BaseHTTPRequestHandler):
+    server: "FakeMastodonServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, body, headers: dict = {}):
+        self.send_body(status, json.dumps(body).encode(), "application/json", headers)
+
+    def send_body(self, status: int, data: bytes, content_type: str, headers: dict = {}):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+
+        for name, value in headers.items():
+            self.send_header(name, value)
+
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_params(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode() if length else ""
+
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            return json.loads(body or "{}")
+
+        return {key: values[-1] for key, values in parse_qs(body).items()}
+
+    def handle_request(self, method: str):
+        state = self.server.state
+
+        with state.lock:
+            state.in_flight += 1
+            state.max_in_flight = max(state.max_in_flight, state.in_flight)
+
+        try:
+            if state.latency:
+                time.sleep(state.latency)
+
+            url = urlparse(self.path)
+
+            if url.path == "/archive.csv":
+                # Not an API route, so no rate limit
+                return self.send_archive()
+
+            allowed, remaining, reset = state.take_request()
+            headers = {
+                "X-RateLimit-Limit": str(state.rate_limit),
+                "X-RateLimit-Remaining": str(remaining),
+                "X-RateLimit-Reset": format_time(datetime.fromtimestamp(reset, tz=timezone.utc))
+            }
+
+            if not allowed:
+                return self.send_json(429, {"error": "Too many requests"}, headers)
+
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            status, body, extra_headers = self.route(method, url.path.rstrip("/"), query)
+            self.send_json(status, body, headers | extra_headers)
+        finally:
+            with state.lock:
+                state.in_flight -= 1
+
+    def send_archive(self):
+        state = self.server.state
+
+        if state.archive is None:
+            return self.send_json(404, {"error": "No archive, start the server with archive rows"})
+
+        if self.headers.get("If-None-Match") == state.archive_etag:
+            return self.send_body(304, b"", "text/csv", {"ETag": state.archive_etag})
+
+        self.send_body(200, state.archive, "text/csv", {"ETag": state.archive_etag})
+
+    def page_links(self, path: str, limit: int, page: list) -> dict:
+        if not page:
+            return {}
+
+        base = f"http://{self.headers['Host']}{path}?limit={limit}"
+        return {"Link": f'<{base}&max_id={page[-1]["id"]}>; rel="next", <{base}&min_id={page[0]["id"]}>; rel="prev"'}
+
+    def route(self, method: str, path: str, query: dict):
+        state = self.server.state
+
+        if method == "GET" and path in ("/api/v1/instance", "/api/v2/instance"):
+            return 200, {"uri": "fake.local", "title": "Fake Mastodon", "version": "4.2.0"}, {}
+
+        if method == "POST" and path == "/api/v1/statuses":
+            params = self.read_params()
+            scheduled_at = params.get("scheduled_at")
+
+            if not scheduled_at:
+                return 422, {"error": "Only scheduled statuses are supported"}, {}
+
+            scheduled_at = datetime.fromisoformat(scheduled_at.replace("Z", "+00:00"))
+
+            if scheduled_at - datetime.now(timezone.utc) < MIN_SCHEDULE_DELAY:
+                return 422, {"error": "Validation failed: Scheduled at The scheduled date must be in the future"}, {}
+
+            status = state.schedule_status(params.get("status", ""), params.get("visibility", "public"), scheduled_at, self.headers.get("Idempotency-Key"))
+
+            if status is None:
+                return 422, {"error": f"Validation failed: You have exceeded the limit of {MAX_SCHEDULED} scheduled statuses"}, {}
+
+            return 200, status, {}
+
+        limit = min(int(query.get("limit", 20)), 40)
+        cursors = {key: int(query[key]) for key in ("max_id", "min_id", "since_id") if key in query}
+
+        if method == "GET" and path == "/api/v1/scheduled_statuses":
+            page = state.scheduled_page(limit, **cursors)
+            return 200, page, self.page_links(path, limit, page)
+
+        if method == "GET" and path == "/api/v1/accounts/verify_credentials":
+            return 200, ACCOUNT, {}
+
+        if method == "GET" and path == f"/api/v1/accounts/{ACCOUNT['id']}/statuses":
+            state.publish_due()
+            page = state.page(state.statuses, limit, **cursors)
+            return 200, page, self.page_links(path, limit, page)
+
+        match = re.fullmatch(r"/api/v1/scheduled_statuses/(\d+)", path)
+
+        if method == "DELETE" and match:
+            if not state.delete_scheduled(int(match[1])):
+                return 404, {"error": "Record not found"}, {}
+
+            return 200, {}, {}
+
+        return 404, {"error": "Record not found"}, {}
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def do_DELETE(self):
+        self.handle_request("DELETE")
+
+class FakeMastodonServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, **state_options):
+        super().__init__(("127.0.0.1", port), FakeMastodonHandler)
+        self.state = FakeMastodon(**state_options)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        """Serve from a background thread, returning the server for chaining"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local fake Mastodon instance")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--rate-limit", type=int, default=300, help="requests allowed per rate limit window")
+    parser.add_argument("--rate-period", type=float, default=300, help="length of the rate limit window in seconds")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to delay every response by")
+    parser.add_argument("--archive-rows", type=int, default=0, help="rows of the synthetic archive served at /archive.csv")
+    parser.add_argument("--published", type=int, default=0, help="published posts the account starts with")
+    args = parser.parse_args()
+
+    server = FakeMastodonServer(
+        args.port, rate_limit=args.rate_limit, rate_period=args.rate_period, latency=args.latency,
+        archive_rows=args.archive_rows, published=args.published
+    )
+    print(f"Fake Mastodon listening on {server.url}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
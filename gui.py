@@ -0,0 +1,797 @@
+from telemetry import mark_startup, timed
+import core
+from datetime import datetime, timedelta, timezone as dt_timezone #time stuff
+import tkinter as tk #UI
+from tkinter import ttk #UI
+import threading #UI
+import queue
+import time
+from schedule_model import Gap, Schedule, ScheduledPost
+from batch import entry_post
+from outbox import entry_time
+from virtual_list import VirtualList
+from schedule_plan import Calendar
+from schedule_time import daily_slots, get_zone, max_amount, span_days
+from schedule_store import RECONCILE_INTERVAL, SCHEDULE_CACHE_PATH, iter_scheduled_pages, load_cached_schedule, save_cached_schedule
+
+# These are also the default values
+prev_selected_tz = "US/Eastern"
+prev_selected_hr_type = "AM"
+
+ROW_HEIGHT = 50
+UI_POLL_INTERVAL = 100 # ms between applying updates from worker threads
+
+# (event, value) pairs published by worker threads, only the Tk thread touches widgets
+ui_events = queue.Queue()
+
+progress_total = progress_done = 0
+progress_started = 0.0
+
+# The authoritative schedule, the rows in the display are only a projection of it
+schedule = Schedule()
+
+# Picks up changes made outside this window once the full schedule is loaded
+reconciler = None
+reconciling = False
+
+# Loading, generating or running a batch, see set_busy
+busy = False
+
+# The account whose schedule is shown, the first one in accounts.json if there is one
+account = core.get_accounts()[0]
+
+mark_startup("imports")
+
+def cache_path():
+    return account.file_path(SCHEDULE_CACHE_PATH)
+
+def set_busy(is_busy: bool):
+    """Disable generating, batches and switching accounts while the schedule is being loaded or changed"""
+    global busy
+    busy = is_busy
+
+    # Generating and filling also stay disabled while there's no room for another post
+    state = tk.DISABLED if busy or posts_entry.get() == "0" else "normal"
+    generate_button["state"] = fill_gaps_button["state"] = fill_calendar_button["state"] = state
+
+    if account_combo:
+        account_combo["state"] = tk.DISABLED if busy else "readonly"
+        generate_all_button["state"] = state
+
+def selected_time():
+    """The 24 hour (hour, minute) entered for the posts"""
+    hour, minute = int(hour_entry.get()), int(minute_entry.get())
+
+    return (hour % 12) + 12 if am_pm_combo.get() == "PM" else hour % 12 if am_pm_combo.get() == "AM" else hour, minute
+
+def get_base_scheduled_time():
+    """Get the next time that a video should be scheduled determined
+    by the latest currently scheduled post if any"""
+
+    # Posts still waiting in the outbox take their days too
+    latest = core.planned_schedule(schedule, account).latest()
+
+    return core.next_scheduled_time(latest.scheduled_time if latest else None, *selected_time(), timezone_combo.get())
+
+def format_time(time: datetime):
+    """Display a utc time in the selected timezone and hour format"""
+    local_time = time.astimezone(get_zone(timezone_combo.get()))
+
+    return local_time.strftime("%Y-%m-%d %H:%M" if am_pm_combo.get() == "24 hr" else "%Y-%m-%d %I:%M %p")
+
+class ScheduleRow(tk.Frame):
+    """A row of the schedule list that can show either a scheduled post or a gap,
+    reused for different entries as the list is scrolled"""
+
+    def __init__(self, parent):
+        super().__init__(parent, highlightbackground="gray", highlightthickness=1)
+
+        self.gap_frame = tk.Frame(self)
+        self.gap_frame.place(relwidth=1, relheight=1)
+
+        self.gap_label = tk.Label(self.gap_frame)
+        self.gap_label.pack(side="left", expand=True)
+
+        self.fill_button = tk.Button(self.gap_frame, text="Fill")
+        self.fill_button.pack(side="left", padx=5)
+
+        self.post_frame = tk.Frame(self)
+        self.post_frame.place(relwidth=1, relheight=1)
+
+        self.title_label = tk.Label(self.post_frame, width=20, wraplength=150, height=2)
+        self.title_label.pack(side="left")
+
+        self.id_label = tk.Label(self.post_frame, width=5)
+        self.id_label.pack(side="left", padx=5)
+
+        self.time_label = tk.Label(self.post_frame, width=18)
+        self.time_label.pack(side="left", padx=5)
+
+        self.reroll_button = tk.Button(self.post_frame, text="Re-Roll")
+        self.reroll_button.pack(side="left", padx=5)
+
+        self.remove_button = tk.Button(self.post_frame, text="Remove")
+        self.remove_button.pack(side="left", padx=5)
+
+    def show(self, entry: ScheduledPost | Gap):
+        if isinstance(entry, Gap):
+            self.gap_label.config(text=f"{entry.days} day gap")
+            self.fill_button.config(command=lambda gap=entry: fill_gaps([gap]))
+            return self.gap_frame.lift()
+
+        self.title_label.config(text=entry.title)
+        self.id_label.config(text=entry.post_id)
+        self.time_label.config(text=format_time(entry.scheduled_time))
+        self.reroll_button.config(command=lambda post_id=entry.post_id: reroll(post_id))
+        self.remove_button.config(command=lambda post_id=entry.post_id: remove_row(post_id))
+        self.post_frame.lift()
+
+@timed("render_schedule")
+def init_schedule_rows():
+    """Initialize the schedule display from the schedule model"""
+    schedule_list.set_items(list(schedule.entries(datetime.now(tz=dt_timezone.utc))))
+
+@timed("add_schedule_row")
+def add_schedule_row(post: ScheduledPost, refresh=True):
+    """Add a post that's later than every other scheduled post to the model and the top of the display.
+    With refresh=False the display is only updated by the next refresh.
+
+    A post the model already has, e.g. from a reconcile poll while generating, or one that isn't the latest
+    is only added to the model, returning False so the caller renders the whole schedule again"""
+    latest = schedule.latest()
+    known = post.post_id in schedule
+    schedule.add(post)
+
+    if known or (latest and latest.sort_key() >= post.sort_key()):
+        return False
+
+    previous_time = latest.scheduled_time if latest else datetime.now(tz=dt_timezone.utc)
+    gap_amount = (post.scheduled_time - previous_time).days
+    entries = [Gap(gap_amount - 1, previous_time, post.scheduled_time), post] if gap_amount > 1 else [post]
+
+    schedule_list.extend(entries, refresh)
+
+    return True
+
+def start_progress(total: int):
+    global progress_total, progress_done, progress_started
+
+    progress_total, progress_done, progress_started = total, 0, time.perf_counter()
+    progress_bar.configure(maximum=total, value=0)
+    progress_label.config(text=f"0/{total} posts")
+
+def update_progress(done: int):
+    global progress_done
+
+    progress_done += done
+    progress_bar.configure(value=progress_done)
+
+    rate = progress_done / max(time.perf_counter() - progress_started, 1e-6)
+    eta = timedelta(seconds=round((progress_total - progress_done) / rate)) if rate else "?"
+
+    progress_label.config(text=f"{progress_done}/{progress_total} posts, {rate:.1f} posts/s, ETA {eta}")
+
+def drain_ui_events():
+    """Apply everything the worker threads published since the last drain, redrawing the schedule only once"""
+    global reconciler, reconciling
+
+    scheduled = filled = waiting = 0
+    needs_render = False
+
+    while True:
+        try:
+            event, value = ui_events.get_nowait()
+        except queue.Empty:
+            break
+
+        if event == "scheduled":
+            if not add_schedule_row(value, refresh=False):
+                needs_render = True
+            scheduled += 1
+
+        elif event == "filled":
+            # Calendar slots can be anywhere in the schedule, not only after the latest post
+            schedule.add(value)
+            filled += 1
+            needs_render = True
+
+        elif event == "generated":
+            save_cached_schedule(schedule, cache_path())
+            set_busy(False)
+            waiting = value
+
+        elif event == "generate_failed":
+            print("\033[93m", f"Couldn't schedule every post: {value}", "\033[00m")
+            save_cached_schedule(schedule, cache_path())
+            set_busy(False)
+
+        elif event == "page":
+            for post in value:
+                schedule.add(post)
+
+            needs_render = True
+
+        elif event == "pages_loaded":
+            # Everything the server didn't return was published or removed since the cache was written
+            schedule.reset(value)
+            sync_time_entries()
+            save_cached_schedule(schedule, cache_path())
+
+            reconciler = core.make_reconciler(value, account)
+
+            if not reconciling:
+                reconciling = True
+                root.after(RECONCILE_INTERVAL * 1000, reconcile)
+
+            set_busy(False)
+            needs_render = True
+            mark_startup("schedule_loaded")
+
+        elif event == "batch_slot":
+            if value["old_id"] in schedule:
+                schedule.remove(value["old_id"])
+
+            schedule.add(entry_post(value))
+            needs_render = True
+
+        elif event in ("batch_done", "batch_failed"):
+            if event == "batch_failed":
+                print("\033[93m", f"Couldn't finish the batch, it will be resumed on the next start: {value}", "\033[00m")
+
+            save_cached_schedule(schedule, cache_path())
+            set_busy(False)
+
+        elif event == "resume_batch":
+            start_batch(lambda on_done: core.resume_batch(len(schedule), on_done, account))
+
+        elif event == "reconciled":
+            polled, (changed, removed) = value
+
+            if polled is not reconciler:
+                # From the account shown before switching
+                changed = removed = ()
+
+            for post_id in removed:
+                if post_id in schedule:
+                    schedule.remove(post_id)
+
+            for post in changed:
+                schedule.add(post)
+
+            if changed or removed:
+                save_cached_schedule(schedule, cache_path())
+                needs_render = True
+
+            if polled is reconciler:
+                stats = polled.stats
+                sync_label.config(text=f"Synced at {datetime.now():%H:%M:%S} in {stats['last_duration']:.2f}s with {stats['last_requests']} requests")
+
+            reconcile_next(polled)
+
+        elif event == "reconcile_failed":
+            polled, error = value
+
+            if polled is reconciler:
+                sync_label.config(text=f"Couldn't sync at {datetime.now():%H:%M:%S}: {error}")
+
+            reconcile_next(polled)
+
+        elif event == "removed":
+            removed_for, post_id = value
+
+            # The gaps around the row change too, so the whole view is rendered again from the model
+            if removed_for is account and post_id in schedule:
+                schedule.remove(post_id)
+                needs_render = True
+
+        elif event == "outbox_sent":
+            sent_for, post = value
+
+            if sent_for is account:
+                schedule.add(post)
+                save_cached_schedule(schedule, cache_path())
+                needs_render = True
+
+        elif event == "connected":
+            mark_startup("connected")
+
+        elif event == "pages_failed":
+            print("\033[93m", f"Couldn't load the scheduled posts, showing the cached schedule: {value}", "\033[00m")
+            set_busy(False)
+
+    if needs_render:
+        init_schedule_rows()
+    elif scheduled:
+        with timed("refresh_schedule"):
+            schedule_list.refresh()
+
+    if scheduled or filled:
+        update_progress(scheduled + filled)
+
+    if waiting:
+        progress_label.config(text=f"{waiting} posts are waiting to be sent, they go out once {account} can be reached")
+
+    if scheduled or filled or needs_render:
+        posts_entry_updated(None)
+
+    mark_startup("interactive") # the first drain runs once the window is up and handling events
+    root.after(UI_POLL_INTERVAL, drain_ui_events)
+
+def reconcile():
+    """Poll the server for changes made elsewhere without blocking the window,
+    the next poll is scheduled once this one's result is applied"""
+    current = reconciler
+
+    def poll():
+        try:
+            ui_events.put(("reconciled", (current, current.poll())))
+        except Exception as e:
+            ui_events.put(("reconcile_failed", (current, e)))
+
+    threading.Thread(target=poll, daemon=True).start()
+
+def reconcile_next(polled):
+    """Schedule the poll after the one of polled. A poll of the account shown before switching ends its
+    chain, which carries on with the new account's reconciler if its schedule already loaded"""
+    global reconciling
+
+    if polled is reconciler or reconciler is not None:
+        root.after(RECONCILE_INTERVAL * 1000, reconcile)
+    else:
+        reconciling = False # started again once the new account's schedule is loaded
+
+def ordinal_suffix(num):
+    suffixes = {1: 'st', 2: 'nd', 3: 'rd'}
+
+    return 'th' if 11 <= num <= 13 else suffixes.get(num % 10, 'th')
+
+# Tkinter UI functions
+def generate_posts():
+    base_time = get_base_scheduled_time()
+    timezone = timezone_combo.get()
+    amount = int(posts_entry.get())
+
+    if not amount:
+        return
+
+    num_posts = span_days(base_time, amount, time_units_combo.get().lower(), timezone)
+
+    set_busy(True)
+    start_progress(num_posts)
+
+    recent_titles = [post.title for post in core.planned_schedule(schedule, account)]
+    generating_for = account
+
+    def on_scheduled(video, post_id, time):
+        ui_events.put(("scheduled", ScheduledPost(video.title, post_id, time)))
+
+    # Runs off the Tk thread, so everything for the display goes through ui_events
+    def run_generate_posts():
+        try:
+            waiting = core.bulk_post_to_mastodon(num_posts, base_time, timezone, on_scheduled, recent_titles, generating_for)
+        except Exception as e:
+            return ui_events.put(("generate_failed", e))
+
+        ui_events.put(("generated", waiting))
+
+    generation_thread = threading.Thread(target=run_generate_posts, daemon=True)
+    generation_thread.start()
+
+def generate_all_accounts():
+    """Generate the chosen range for every account at once, each continuing from its own latest post"""
+    hour, minute = selected_time()
+    timezone = timezone_combo.get()
+    amount, units = int(posts_entry.get()), time_units_combo.get().lower()
+    shown = account
+
+    # Shown as they come in like a page of the schedule, the progress is only known per account
+    def on_scheduled(video, post_id, time):
+        ui_events.put(("page", [ScheduledPost(video.title, post_id, time)]))
+
+    def generate_for(selected):
+        posts = core.planned_schedule(core.fetch_schedule(selected), selected)
+        latest = posts.latest()
+        base_time = core.next_scheduled_time(latest.scheduled_time if latest else None, hour, minute, timezone)
+        num_posts = min(span_days(base_time, amount, units, timezone), core.room_left(posts))
+
+        # Only the shown account's posts go into the display
+        return core.bulk_post_to_mastodon(
+            num_posts, base_time, timezone, on_scheduled if selected is shown else None, [post.title for post in posts], selected
+        )
+
+    set_busy(True)
+    progress_label.config(text=f"Generating for {len(core.get_accounts())} accounts")
+
+    def run_generate_all():
+        results = core.for_each_account(core.get_accounts(), generate_for)
+        waiting = 0
+
+        for selected, result in results.items():
+            if isinstance(result, BaseException):
+                print("\033[93m", f"[{selected}] Couldn't schedule every post: {result}", "\033[00m")
+            else:
+                waiting += result
+
+        ui_events.put(("generated", waiting))
+
+    threading.Thread(target=run_generate_all, daemon=True).start()
+
+def fill_calendar():
+    """Schedule a post in every empty slot of the calendar over the range chosen above, starting now"""
+    try:
+        calendar = Calendar(calendar_entry.get())
+    except ValueError as e:
+        return print("\033[93m", e, "\033[00m")
+
+    timezone = timezone_combo.get()
+    now = datetime.now().astimezone()
+    end = now + timedelta(days=span_days(now, int(posts_entry.get()), time_units_combo.get().lower(), timezone))
+
+    planned = core.planned_schedule(schedule, account)
+    slots = core.plan_calendar(calendar, planned, timezone, end, now)
+
+    if not slots:
+        return print("\033[93m", "Every slot of the calendar in that range is already filled", "\033[00m")
+
+    set_busy(True)
+    start_progress(len(slots))
+
+    recent_titles = [post.title for post in planned]
+    filling_for = account
+
+    def on_scheduled(video, post_id, time):
+        ui_events.put(("filled", ScheduledPost(video.title, post_id, time)))
+
+    def run_fill_calendar():
+        try:
+            waiting = core.schedule_slots(slots, on_scheduled, recent_titles, filling_for)
+        except Exception as e:
+            return ui_events.put(("generate_failed", e))
+
+        ui_events.put(("generated", waiting))
+
+    threading.Thread(target=run_fill_calendar, daemon=True).start()
+
+def clamp_min(e):
+    minutes = minute_entry.get()
+    minute_entry.delete(0, tk.END)
+
+    try:
+        minutes = min(59, max(0, int(minutes)))
+    except:
+        return minute_entry.insert(0, "00")
+    
+    minute_entry.insert(0, f"0{minutes}" if minutes < 10 else minutes)
+
+def clamp_hour(e):
+    hour = hour_entry.get()
+    hour_entry.delete(0, tk.END)
+    hr_24 = am_pm_combo.get().lower() == "24 hr"
+
+    try:
+        hour = min(23 if hr_24 else 12, max(0, int(hour)))
+        assert hr_24 or hour != 0
+    except:
+        return hour_entry.insert(0, "00" if hr_24 else "12")
+    
+    hour_entry.insert(0, f"0{hour}" if hour < 10 else hour)
+
+def posts_entry_updated(e):
+    amount = posts_entry.get()
+    posts_entry.delete(0, tk.END)
+
+    try:
+        amount = int(amount)
+    except:
+        amount = 1
+    
+    units = time_units_combo.get().lower()
+    base_time = get_base_scheduled_time()
+
+    # As much as still fits in the instance's limit of scheduled posts
+    room = core.room_left(core.planned_schedule(schedule, account))
+    posts_entry.insert(0, min(max_amount(base_time, units, timezone_combo.get(), room), max(1, amount)))
+
+    # update amount to clamped value
+    amount = int(posts_entry.get())
+    set_busy(busy)
+
+    if amount == 0:
+        return range_details_label.config(text=f"Only {room} more posts fit in the instance's limit of {core.MAX_SCHEDULED_POSTS} scheduled posts")
+
+    # Apparently removing trailing 0s with strftime might work differently across os's
+
+    if amount == 1 and units == "days":
+        return range_details_label.config(text=f"Scheduling for {base_time.strftime("%b")} {base_time.day}{ordinal_suffix(base_time.day)}")
+
+    timezone = timezone_combo.get()
+    to = daily_slots(base_time, span_days(base_time, amount, units, timezone), timezone)[-1]
+
+    range_details_label.config(
+        text=f"Scheduling from {base_time.strftime("%b")} {base_time.day}{ordinal_suffix(base_time.day)} to {to.strftime("%b")} {to.day}{ordinal_suffix(to.day)}"
+    )
+
+def remove_row(post_id: str):
+    """Delete the post off the Tk thread like a batch, it can wait on the rate limit for a while"""
+    removing_for = account
+
+    def run_remove(on_done):
+        try:
+            core.delete_scheduled_post(post_id, removing_for)
+        except Exception as e:
+            # Not a journaled batch, so there's nothing to resume
+            return print("\033[93m", f"Couldn't remove the post {post_id}: {e}", "\033[00m")
+
+        ui_events.put(("removed", (removing_for, post_id)))
+
+    start_batch(run_remove)
+
+def fill_timezones():
+    if len(timezone_combo["values"]) > 1: return
+
+    import pytz #timezone list
+
+    timezone_combo["values"] = pytz.all_timezones
+
+def changed_timezone(e):
+    global prev_selected_tz
+
+    if timezone_combo.get() == prev_selected_tz: return
+
+    schedule_list.refresh()
+    prev_selected_tz = timezone_combo.get()
+
+def changed_hour_type(e):
+    global prev_selected_hr_type
+    
+    if am_pm_combo.get() == prev_selected_hr_type: return
+
+    clamp_hour(None)
+    schedule_list.refresh()
+    prev_selected_hr_type = am_pm_combo.get()
+
+def select_all(e: tk.Event):
+    e.widget.select_range(0, tk.END)
+    e.widget.icursor(0)
+
+def start_batch(run):
+    """Call run(on_done) off the Tk thread for a re-roll or gap fill. Each finished
+    slot is passed to on_done and applied to the schedule through ui_events"""
+
+    # The buttons are disabled while the schedule is loading, generating or another batch is running
+    if str(generate_button["state"]) == tk.DISABLED:
+        return print("\033[93m", "Wait for the schedule to finish updating first", "\033[00m")
+
+    set_busy(True)
+
+    def run_batch():
+        try:
+            run(lambda entry: ui_events.put(("batch_slot", entry)))
+        except Exception as e:
+            return ui_events.put(("batch_failed", e))
+
+        ui_events.put(("batch_done", None))
+
+    threading.Thread(target=run_batch, daemon=True).start()
+
+def reroll(post_id: str):
+    scheduled = list(schedule)
+    batch_account = account
+
+    start_batch(lambda on_done: core.reroll_posts([schedule.get(post_id)], scheduled, on_done, batch_account))
+
+def fill_gaps(gaps=None):
+    """Fill the given gaps, or every gap in the schedule"""
+    gaps = gaps or schedule.gaps(datetime.now(tz=dt_timezone.utc))
+    scheduled = list(schedule)
+    timezone = timezone_combo.get()
+    batch_account = account
+
+    start_batch(lambda on_done: core.fill_gaps(gaps, scheduled, timezone, on_done, batch_account))
+
+def changed_account(e):
+    global account
+
+    selected = core.get_account(account_combo.get())
+
+    if selected is account: return
+
+    account = selected
+    load_schedule()
+    posts_entry_updated(None)
+
+def sync_time_entries():
+    """Default the time entries to the time of the latest scheduled post"""
+    latest = schedule.latest()
+
+    if not latest:
+        return
+
+    date = latest.scheduled_time.astimezone(get_zone(timezone_combo.get()))
+    hour_entry.delete(0, tk.END)
+
+    if am_pm_combo.get() == "24 hr":
+        hour_entry.insert(0, f"0{date.hour}" if date.hour < 10 else date.hour)
+    else:
+        am_pm_combo.set("AM" if date.hour < 12 else "PM")
+        hr_12 = 12 if date.hour == 0 else date.hour if date.hour <= 12 else date.hour - 12
+        hour_entry.insert(0, f"0{hr_12}" if hr_12 < 10 else hr_12)
+
+    minute_entry.delete(0, tk.END)
+    minute_entry.insert(0, f"0{date.minute}" if date.minute < 10 else date.minute)
+
+def load_schedule():
+    """Show the last known schedule right away and reconcile it with
+    the server's scheduled statuses as they're fetched in the background"""
+
+    global reconciler
+
+    schedule.reset(load_cached_schedule(cache_path()))
+    reconciler = None
+    init_schedule_rows()
+    sync_time_entries()
+
+    # Generating depends on the latest scheduled post so it has to wait for the real schedule
+    set_busy(True)
+    loading = account
+
+    # Whatever couldn't be sent before keeps going out in the background while the window is open
+    core.start_sender(loading, lambda entry, post_id: ui_events.put(
+        ("outbox_sent", (loading, ScheduledPost(entry["title"], post_id, entry_time(entry))))
+    ))
+
+    def fetch_pages():
+        server_posts = []
+
+        # Checked here instead of before the window opens, the cached schedule is shown in the meantime
+        if not core.check_connection(loading):
+            return ui_events.put(("pages_failed", ConnectionError(f"Couldn't connect to {loading}")))
+
+        ui_events.put(("connected", None))
+
+        try:
+            for page in iter_scheduled_pages(loading.get_mastodon(), loading.bucket):
+                server_posts.extend(page)
+                ui_events.put(("page", page))
+        except Exception as e:
+            return ui_events.put(("pages_failed", e))
+
+        ui_events.put(("pages_loaded", server_posts))
+
+        if core.has_pending_batch(loading):
+            ui_events.put(("resume_batch", None))
+
+        try:
+            core.sync_history(loading)
+        except Exception as e:
+            print("\033[93m", f"Couldn't sync the post history: {e}", "\033[00m")
+
+    threading.Thread(target=fetch_pages, daemon=True).start()
+
+# UI Window
+root = tk.Tk()
+root.geometry("625x650")
+root.title("Mastodon Post Generator")
+
+# Only shown when accounts.json lists more than the account from .env
+account_combo = None
+
+if account.name:
+    account_combo = ttk.Combobox(root, values=[entry.name for entry in core.get_accounts()], state="readonly")
+    account_combo.set(account.name)
+    account_combo.bind("<<ComboboxSelected>>", changed_account)
+    account_combo.pack(pady=(5, 0))
+
+posts_label = tk.Label(root, text="Schedule videos for the next:")
+posts_label.pack(pady=5)
+
+posts_frame = tk.Frame(root)
+posts_frame.pack()
+
+posts_entry = tk.Entry(posts_frame)
+posts_entry.insert(0, 1)
+posts_entry.bind("<Return>", posts_entry_updated)
+posts_entry.bind("<FocusOut>", posts_entry_updated)
+posts_entry.grid(row=0, column=0, padx=(0, 10))
+
+time_units_combo = ttk.Combobox(posts_frame, values=["Days", "Weeks", "*Months"], width=8, state="readonly")
+time_units_combo.set("Days")
+time_units_combo.bind("<<ComboboxSelected>>", posts_entry_updated)
+time_units_combo.grid(row=0, column=1)
+
+range_details_label = tk.Label(root)
+range_details_label.pack()
+
+scheduled_time_label = tk.Label(root, text="Enter scheduled time")
+scheduled_time_label.pack(pady=(15, 0))
+
+time_frame = tk.Frame(root)
+time_frame.pack()
+
+hour_label = tk.Label(time_frame, text="Hour")
+hour_label.grid(row=0, column=0, padx=4)
+hour_entry = tk.Entry(time_frame, width=6)
+hour_entry.insert(0, 12)
+hour_entry.bind("<Return>", clamp_hour)
+hour_entry.bind("<FocusOut>", clamp_hour)
+hour_entry.bind("<FocusIn>", select_all)
+hour_entry.grid(row=1, column=0, padx=4)
+
+separator_label = tk.Label(time_frame, text=":")
+separator_label.grid(row=1, column=1, padx=4)
+
+minute_label = tk.Label(time_frame, text="Minute")
+minute_label.grid(row=0, column=2, padx=4)
+minute_entry = tk.Entry(time_frame, width=6)
+minute_entry.insert(0, "00")
+minute_entry.bind("<Return>", clamp_min)
+minute_entry.bind("<FocusOut>", clamp_min)
+minute_entry.bind("<FocusIn>", select_all)
+minute_entry.grid(row=1, column=2, padx=4)
+
+am_pm_combo = ttk.Combobox(time_frame, values=["AM", "PM", "24 hr"], width=5, state="readonly")
+am_pm_combo.set(prev_selected_hr_type)
+am_pm_combo.bind("<<ComboboxSelected>>", changed_hour_type)
+am_pm_combo.grid(row=1, column=3, padx=4)
+
+timezone_label = tk.Label(root, text="Select timezone:")
+timezone_label.pack(pady=10)
+# The ~600 timezones are only listed once the dropdown is first opened
+timezone_combo = ttk.Combobox(root, values=[prev_selected_tz], state="readonly", postcommand=fill_timezones)
+timezone_combo.set(prev_selected_tz)
+timezone_combo.bind("<<ComboboxSelected>>", changed_timezone)
+timezone_combo.pack()
+
+buttons_frame = tk.Frame(root)
+buttons_frame.pack(pady=(10, 0))
+
+generate_button = tk.Button(buttons_frame, text="Generate Posts", command=generate_posts)
+generate_button.grid(row=0, column=0, padx=5)
+
+fill_gaps_button = tk.Button(buttons_frame, text="Fill All Gaps", command=fill_gaps)
+fill_gaps_button.grid(row=0, column=1, padx=5)
+
+if account_combo:
+    generate_all_button = tk.Button(buttons_frame, text="Generate for All Accounts", command=generate_all_accounts)
+    generate_all_button.grid(row=0, column=2, padx=5)
+
+calendar_frame = tk.Frame(root)
+calendar_frame.pack(pady=(5, 0))
+
+calendar_label = tk.Label(calendar_frame, text="Calendar:")
+calendar_label.grid(row=0, column=0, padx=4)
+# Daily times with an optional weekday filter, or cron rules, see schedule_plan.py
+calendar_entry = tk.Entry(calendar_frame, width=28)
+calendar_entry.insert(0, "12:00")
+calendar_entry.grid(row=0, column=1, padx=4)
+
+fill_calendar_button = tk.Button(calendar_frame, text="Fill Calendar", command=fill_calendar)
+fill_calendar_button.grid(row=0, column=2, padx=4)
+
+progress_bar = ttk.Progressbar(root, length=300)
+progress_bar.pack(pady=(5, 0))
+
+progress_label = tk.Label(root)
+progress_label.pack()
+
+sync_label = tk.Label(root, fg="gray")
+sync_label.pack(pady=(0, 5))
+
+scroll_frame = tk.Frame(root, borderwidth=5, highlightthickness=2, highlightbackground="gray")
+scroll_frame.pack(fill="y", expand=True)
+
+schedule_list = VirtualList(scroll_frame, ScheduleRow, ROW_HEIGHT, height=300, width=465)
+
+mark_startup("window_built")
+
+load_schedule()
+posts_entry_updated(None)
+mark_startup("cached_schedule")
+drain_ui_events()
+
+root.mainloop()
+
+# TODO
+# When creating a gap for the bottom entry in the schedule, take selected time into consideration for displaying gap length
+
+# Display rate limit counter and time until refresh, allow much quicker scheduling up until the limit is reached
\ No newline at end of file
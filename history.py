@@ -0,0 +1,144 @@
+import html
+import re
+import sqlite3
+import time
+from datetime import datetime, timezone
+from bulk_scheduler import TokenBucket, call_with_backoff
+from templates import get_template
+
+HISTORY_PATH = "post_history.db"
+HISTORY_VERSION = 1 # bump whenever the table layout changes
+
+PAGE_SIZE = 40 # largest page the account statuses endpoint hands out
+
+# A published copy of a post this tool scheduled is recognized as the same post within this many seconds
+SAME_POST_WINDOW = 60 * 60
+
+def to_epoch(time: datetime) -> int:
+    return int(time.astimezone(timezone.utc).timestamp())
+
+def parse_published_status(status):
+    """The (title, alt_link) a published status was about, or None if it isn't one of this tool's posts"""
+    text = re.sub(r"<br\s*/?>|</p>", "\n", status["content"])
+    # Mastodon hides parts of long links in invisible spans, so stripping the tags gives back the full link
+    text = html.unescape(re.sub(r"<[^>]+>", "", text))
+
+    fields = get_template().parse(text)
+
+    return (fields["title"], fields["alt_link"]) if fields and "title" in fields and "alt_link" in fields else None
+
+class PostHistory:
+    """Append only record of every video that was posted or scheduled, kept in a local sqlite database
+    so recently featured videos can still be avoided after their posts are published.
+
+    Posts are recorded with their outbox idempotency key while they're queued, which is replaced by the id
+    the instance gives them once they're sent. Only posts the outbox gave up on are removed again,
+    a video that was scheduled and then removed still counts as featured"""
+
+    def __init__(self, path=HISTORY_PATH):
+        self.path = path
+
+        with self.connect() as db:
+            if db.execute("PRAGMA user_version").fetchone()[0] != HISTORY_VERSION:
+                db.execute("DROP TABLE IF EXISTS meta")
+                db.execute("DROP TABLE IF EXISTS posts")
+                db.execute(f"PRAGMA user_version = {HISTORY_VERSION}")
+
+            db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            # posted_at is in epoch seconds, source is either "scheduled" or "published"
+            db.execute("CREATE TABLE IF NOT EXISTS posts (alt_link TEXT, title TEXT, posted_at INTEGER, status_id TEXT, source TEXT)")
+            db.execute("CREATE INDEX IF NOT EXISTS posts_by_link ON posts (alt_link, posted_at)")
+            db.execute("CREATE INDEX IF NOT EXISTS posts_by_time ON posts (posted_at)")
+
+    def connect(self):
+        # A new connection per call so worker threads can record posts too
+        return sqlite3.connect(self.path)
+
+    def meta(self) -> dict[str, str]:
+        with self.connect() as db:
+            return dict(db.execute("SELECT key, value FROM meta"))
+
+    def record(self, entries, source="scheduled"):
+        """Append (title, alt_link, posted_at, status_id) entries, skipping any
+        that are already recorded for around the same time. Returns how many were added"""
+        added = 0
+
+        with self.connect() as db:
+            for title, alt_link, posted_at, status_id in entries:
+                posted_at = to_epoch(posted_at)
+
+                added += db.execute(
+                    "INSERT INTO posts SELECT ?, ?, ?, ?, ? WHERE NOT EXISTS "
+                    "(SELECT 1 FROM posts WHERE alt_link = ? AND posted_at BETWEEN ? AND ?)",
+                    (alt_link, title, posted_at, str(status_id), source,
+                     alt_link, posted_at - SAME_POST_WINDOW, posted_at + SAME_POST_WINDOW)
+                ).rowcount
+
+        return added
+
+    def sent(self, key: str, status_id):
+        """Replace a queued post's idempotency key with the id the instance gave it"""
+        with self.connect() as db:
+            db.execute("UPDATE posts SET status_id = ? WHERE status_id = ? AND source = 'scheduled'", (str(status_id), key))
+
+    def forget(self, key: str):
+        """Remove a queued post that was never sent, its video wasn't featured after all"""
+        with self.connect() as db:
+            db.execute("DELETE FROM posts WHERE status_id = ? AND source = 'scheduled'", (key,))
+
+    def recent_titles(self, limit: int, before: datetime = None) -> list[str]:
+        """Titles of the latest limit posts before the given time, or of all time, oldest first"""
+        before = to_epoch(before) if before else 2 ** 62
+
+        with self.connect() as db:
+            rows = db.execute("SELECT title FROM posts WHERE posted_at < ? ORDER BY posted_at DESC LIMIT ?", (before, limit))
+
+            return [title for title, in rows][::-1]
+
+    def links_since(self, since: datetime) -> set[str]:
+        """Links of every video posted or scheduled at or after since, for constant time exclusion checks"""
+        with self.connect() as db:
+            return {alt_link for alt_link, in db.execute("SELECT DISTINCT alt_link FROM posts WHERE posted_at >= ?", (to_epoch(since),))}
+
+    def sync_published(self, mastodon, bucket: TokenBucket):
+        """Backfill the history from the account's published statuses.
+
+        Only statuses newer than the last synced one are requested, walking forward with min_id,
+        so the full timeline is only downloaded the first time. Returns how many posts were added"""
+        started = time.perf_counter()
+        meta = self.meta()
+        account_id = str(call_with_backoff(mastodon, bucket, mastodon.me)["id"])
+
+        # A different token means a different account whose statuses have to be synced from the start
+        cursor = meta.get("newest_status_id", "0") if meta.get("account_id") == account_id else "0"
+        added = 0
+
+        while True:
+            page = call_with_backoff(
+                mastodon, bucket, mastodon.account_statuses, account_id,
+                exclude_replies=True, exclude_reblogs=True, min_id=cursor, limit=PAGE_SIZE
+            )
+
+            if not page:
+                break
+
+            entries = []
+
+            for status in page:
+                post = parse_published_status(status)
+
+                if post:
+                    entries.append((*post, status["created_at"], status["id"]))
+
+            added += self.record(entries, source="published")
+
+            with self.connect() as db:
+                # Pages come newest first, the cursor is saved per page so an interrupted sync resumes where it stopped
+                cursor = str(max(int(status["id"]) for status in page))
+                db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", (("account_id", account_id), ("newest_status_id", cursor)))
+
+            if len(page) < PAGE_SIZE:
+                break
+
+        print(f"Synced post history in {time.perf_counter() - started:.2f}s ({added} published posts added)")
+        return added
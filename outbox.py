@@ -0,0 +1,231 @@
+"""Posts waiting to be sent to the instance.
+
+Planned posts are written to a local sqlite database first and only sent from there, so planning
+works without a connection and at local speed, and nothing planned is lost when sending stops halfway.
+Every post keeps the idempotency key it was queued with, so sending it again after a timeout or
+a crash can't create it twice"""
+
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from batch import MIN_LEAD_TIME
+from bulk_scheduler import TokenBucket, schedule_post
+
+OUTBOX_PATH = "outbox.db"
+OUTBOX_VERSION = 1 # bump whenever the table layout changes
+
+SEND_BATCH = 20 # posts sent concurrently before the outbox is read again
+RETRY_DELAY = 30 # seconds until a post that couldn't be sent is tried again, doubled after every attempt
+MAX_RETRY_DELAY = 60 * 60
+
+class Outbox:
+    """The account's planned posts, each one either queued, sent (with the id the instance gave it)
+    or failed because the instance refused it. Sent posts are dropped once their time has passed"""
+
+    def __init__(self, path=OUTBOX_PATH):
+        self.path = path
+        # Only one thread sends at a time, the other one would only send the same posts again
+        self.send_lock = threading.Lock()
+
+        with self.connect() as db:
+            # Writing the queue doesn't wait for a sender reading it and the other way around
+            db.execute("PRAGMA journal_mode = WAL")
+
+            if db.execute("PRAGMA user_version").fetchone()[0] != OUTBOX_VERSION:
+                db.execute("DROP TABLE IF EXISTS posts")
+                db.execute(f"PRAGMA user_version = {OUTBOX_VERSION}")
+
+            # scheduled_at and next_attempt are in epoch seconds, status is "queued", "sent" or "failed"
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS posts (key TEXT PRIMARY KEY, message TEXT, scheduled_at INTEGER, title TEXT, alt_link TEXT,"
+                " status TEXT, post_id TEXT, attempts INTEGER, next_attempt REAL, error TEXT)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS posts_by_status ON posts (status, scheduled_at)")
+            db.execute("DELETE FROM posts WHERE status = 'sent' AND scheduled_at < ?", (int(time.time()),))
+
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        # With WAL a crash of the script can't lose a commit, only a power cut can lose the latest ones
+        db.execute("PRAGMA synchronous = NORMAL")
+
+        return db
+
+    def add(self, posts) -> list[str]:
+        """Queue (message, scheduled_time, video) posts, returning their idempotency keys in order"""
+        rows = [
+            (uuid.uuid4().hex, message, int(scheduled_time.timestamp()), video.title, video.alt_link)
+            for message, scheduled_time, video in posts
+        ]
+
+        with self.connect() as db:
+            db.executemany("INSERT INTO posts VALUES (?, ?, ?, ?, ?, 'queued', NULL, 0, 0, NULL)", rows)
+
+        return [row[0] for row in rows]
+
+    def due(self, limit: int) -> list[dict]:
+        """The earliest queued posts that aren't waiting for a retry"""
+        with self.connect() as db:
+            rows = db.execute(
+                "SELECT * FROM posts WHERE status = 'queued' AND next_attempt <= ? ORDER BY scheduled_at LIMIT ?", (time.time(), limit)
+            )
+
+            return [dict(row) for row in rows]
+
+    def queued(self) -> list[dict]:
+        with self.connect() as db:
+            return [dict(row) for row in db.execute("SELECT * FROM posts WHERE status = 'queued' ORDER BY scheduled_at")]
+
+    def next_attempt(self):
+        """Epoch time at which the next queued post is due, or None if nothing is queued"""
+        with self.connect() as db:
+            return db.execute("SELECT MIN(next_attempt) FROM posts WHERE status = 'queued'").fetchone()[0]
+
+    def sent(self, key: str, post_id):
+        with self.connect() as db:
+            db.execute("UPDATE posts SET status = 'sent', post_id = ?, error = NULL WHERE key = ?", (str(post_id), key))
+
+    def retry(self, key: str, error: Exception):
+        with self.connect() as db:
+            db.execute(
+                "UPDATE posts SET attempts = attempts + 1, next_attempt = ? + MIN(? * (1 << attempts), ?), error = ? WHERE key = ?",
+                (time.time(), RETRY_DELAY, MAX_RETRY_DELAY, str(error), key)
+            )
+
+    def fail(self, key: str, error):
+        with self.connect() as db:
+            db.execute("UPDATE posts SET status = 'failed', error = ? WHERE key = ?", (str(error), key))
+
+    def hold(self, keys: list[str]):
+        """Keep every queued post back until the earliest retry of the given posts"""
+        marks = ", ".join("?" * len(keys))
+
+        with self.connect() as db:
+            db.execute(
+                f"UPDATE posts SET next_attempt = (SELECT MIN(next_attempt) FROM posts WHERE key IN ({marks}))"
+                f" WHERE status = 'queued' AND next_attempt < (SELECT MIN(next_attempt) FROM posts WHERE key IN ({marks}))",
+                keys + keys
+            )
+
+    def retry_now(self):
+        """Make every queued post due right away"""
+        with self.connect() as db:
+            db.execute("UPDATE posts SET next_attempt = 0 WHERE status = 'queued'")
+
+def entry_time(entry: dict):
+    return datetime.fromtimestamp(entry["scheduled_at"], tz=timezone.utc)
+
+def is_permanent(error: Exception):
+    """Whether the instance refused the post itself, so sending it again can't work. Connection problems,
+    server errors, rate limits and a bad token are all worth retrying once they're sorted out"""
+    from mastodon import MastodonAPIError, MastodonServerError, MastodonUnauthorizedError
+
+    return isinstance(error, MastodonAPIError) and not isinstance(error, (MastodonServerError, MastodonUnauthorizedError))
+
+def send_outbox(outbox: Outbox, mastodon, bucket: TokenBucket, on_sent=None, on_failed=None, max_workers=4):
+    """Send the due posts in batches, each batch concurrently as fast as the rate limit allows.
+
+    on_sent(entry, post_id) is called from the calling thread in order within each batch,
+    and on_failed(entry) for every post that's given up on because it can't be sent at all.
+    Posts that couldn't be sent are tried again later. Once the instance can't be reached or a whole batch
+    fails, sending stops there instead of trying every other post, holding the rest back until the failed
+    ones are retried. Returns how many posts were sent"""
+
+    from mastodon import MastodonNetworkError
+
+    sent = 0
+    unreachable = threading.Event()
+
+    def send(entry):
+        if unreachable.is_set():
+            return None # left for later without counting as an attempt
+
+        try:
+            return schedule_post(mastodon, bucket, entry["message"], entry["scheduled_at"], entry["key"])
+        except MastodonNetworkError:
+            unreachable.set()
+            raise
+
+    with outbox.send_lock, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while batch := outbox.due(SEND_BATCH):
+            too_late = datetime.now(tz=timezone.utc) + MIN_LEAD_TIME
+
+            for entry in batch:
+                if entry_time(entry) <= too_late:
+                    print("\033[93m", f"Dropped the post of {entry['title']!r} at {entry_time(entry):%Y-%m-%d %H:%M}, it's less than 5 minutes away", "\033[00m")
+                    outbox.fail(entry["key"], "less than 5 minutes away")
+
+                    if on_failed:
+                        on_failed(entry)
+
+            batch = [entry for entry in batch if entry_time(entry) > too_late]
+            futures = [executor.submit(send, entry) for entry in batch]
+            batch_sent = 0
+            failed = []
+
+            for entry, future in zip(batch, futures):
+                error = future.exception()
+
+                if error is None and future.result() is None:
+                    continue
+                elif error is None:
+                    outbox.sent(entry["key"], future.result())
+                    batch_sent += 1
+
+                    if on_sent:
+                        on_sent(entry, future.result())
+                elif is_permanent(error):
+                    print("\033[93m", f"The instance refused the post of {entry['title']!r}: {error}", "\033[00m")
+                    outbox.fail(entry["key"], error)
+
+                    if on_failed:
+                        on_failed(entry)
+                else:
+                    outbox.retry(entry["key"], error)
+                    failed.append(entry["key"])
+
+            sent += batch_sent
+
+            if failed and (unreachable.is_set() or not batch_sent):
+                outbox.hold(failed)
+                break
+
+    return sent
+
+class OutboxSender:
+    """Sends an account's queued posts from a background thread as they become due, until stopped.
+    on_sent and on_failed are called like in send_outbox, from the sender's thread"""
+
+    def __init__(self, outbox: Outbox, account, on_sent=None, on_failed=None, interval=RETRY_DELAY):
+        self.outbox = outbox
+        self.account = account
+        self.on_sent = on_sent
+        self.on_failed = on_failed
+        self.interval = interval
+        self.wake = threading.Event()
+        self.stopped = False
+
+    def start(self):
+        threading.Thread(target=self.run, name="outbox-sender", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopped = True
+        self.wake.set()
+
+    def run(self):
+        while not self.stopped:
+            try:
+                send_outbox(self.outbox, self.account.get_mastodon(), self.account.bucket, self.on_sent, self.on_failed)
+            except Exception as e:
+                print("\033[93m", f"Couldn't send the queued posts of {self.account}: {e}", "\033[00m")
+
+            # Sleep until the next post is due, checking in regularly for posts queued in the meantime
+            next_attempt = self.outbox.next_attempt()
+            wait = self.interval if next_attempt is None else min(self.interval, max(1, next_attempt - time.time()))
+
+            self.wake.wait(wait)
+            self.wake.clear()
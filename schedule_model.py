@@ -0,0 +1,99 @@
+import bisect
+from datetime import datetime, timezone
+
+class ScheduledPost:
+    """A post scheduled on the instance, with its time kept in utc"""
+
+    __slots__ = ("title", "post_id", "scheduled_time")
+
+    def __init__(self, title: str, post_id, scheduled_time: datetime):
+        self.title = title
+        self.post_id = str(post_id)
+        self.scheduled_time = scheduled_time.astimezone(timezone.utc)
+
+    def sort_key(self):
+        # The id breaks ties so every post has a unique position to bisect for
+        return self.scheduled_time, self.post_id
+
+class Gap:
+    """Days without a post between start and end, the times of the posts around it
+    (or the current time for the first gap)"""
+
+    __slots__ = ("days", "start", "end")
+
+    def __init__(self, days: int, start: datetime, end: datetime):
+        self.days = days
+        self.start = start
+        self.end = end
+
+class Schedule:
+    """The account's scheduled posts ordered by time, with a lookup by post id.
+
+    Positions are found with bisect, so lookups around a time are O(log n) and
+    inserting or removing a post only shifts the references after it"""
+
+    def __init__(self, posts=()):
+        self.reset(posts)
+
+    def reset(self, posts):
+        self._posts = sorted(posts, key=ScheduledPost.sort_key)
+        self._keys = [post.sort_key() for post in self._posts]
+        self._by_id = {post.post_id: post for post in self._posts}
+
+    def add(self, post: ScheduledPost):
+        """Insert a post, replacing the one with the same id if there is one"""
+        if post.post_id in self._by_id:
+            self.remove(post.post_id)
+
+        key = post.sort_key()
+        index = bisect.bisect(self._keys, key)
+
+        self._keys.insert(index, key)
+        self._posts.insert(index, post)
+        self._by_id[post.post_id] = post
+
+        return index
+
+    def remove(self, post_id) -> ScheduledPost:
+        post = self._by_id.pop(str(post_id))
+        index = bisect.bisect_left(self._keys, post.sort_key())
+
+        del self._keys[index]
+        del self._posts[index]
+
+        return post
+
+    def get(self, post_id) -> ScheduledPost | None:
+        return self._by_id.get(str(post_id))
+
+    def latest(self) -> ScheduledPost | None:
+        return self._posts[-1] if self._posts else None
+
+    def entries(self, now: datetime):
+        """The posts oldest first, with a Gap in between wherever there is at least one day without a post"""
+        previous_time = now
+
+        for post in self._posts:
+            gap_amount = (post.scheduled_time - previous_time).days
+
+            if gap_amount > 1:
+                yield Gap(gap_amount - 1, previous_time, post.scheduled_time)
+
+            yield post
+            previous_time = post.scheduled_time
+
+    def gaps(self, now: datetime):
+        return [entry for entry in self.entries(now) if isinstance(entry, Gap)]
+
+    def between(self, start: datetime, end: datetime):
+        """The posts scheduled from start up to but not including end"""
+        return self._posts[bisect.bisect_left(self._keys, (start.astimezone(timezone.utc),)):bisect.bisect_left(self._keys, (end.astimezone(timezone.utc),))]
+
+    def __len__(self):
+        return len(self._posts)
+
+    def __iter__(self):
+        return iter(self._posts)
+
+    def __contains__(self, post_id):
+        return str(post_id) in self._by_id
@@ -0,0 +1,162 @@
+"""Calendars of the times to post at, and the empty slots of a calendar given what's already scheduled.
+
+A calendar is one or more rules separated by ";". A rule is either a list of daily times with an optional
+weekday filter, like "09:00 18:00 mon-fri" or "12:00 weekends", or a cron expression with the usual
+minute, hour, day of month, month and day of week fields, like "30 12 1,15 * *". Days are matched in
+local dates and turned into times with localize_series, so slots stay at their wall clock time across DST"""
+
+from datetime import date, datetime, timedelta
+from schedule_time import get_zone, localize_series
+
+WEEKDAY_NAMES = ("sun", "mon", "tue", "wed", "thu", "fri", "sat") # numbered like cron, 0 and 7 are both sunday
+MONTH_NAMES = ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+WEEKDAY_ALIASES = {"daily": "*", "weekdays": "mon-fri", "weekends": "sat,sun"}
+
+# (low, high, names) of the cron fields in order
+FIELDS = ((0, 59, None), (0, 23, None), (1, 31, None), (1, 12, MONTH_NAMES), (0, 7, WEEKDAY_NAMES))
+
+def parse_field(text: str, low: int, high: int, names=None) -> frozenset[int]:
+    """The values a cron field allows, from *, numbers, names, a-b ranges and /n steps joined by commas"""
+    first = 1 if names is MONTH_NAMES else 0
+
+    def value(part: str) -> int:
+        if names and part in names:
+            return names.index(part) + first
+
+        try:
+            return int(part)
+        except ValueError:
+            raise ValueError(f"Unknown calendar value {part!r}, expected a number{' or a name' if names else ''} from {low} to {high}") from None
+
+    values = set()
+
+    for part in text.lower().split(","):
+        part, _, step = part.partition("/")
+
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = map(value, part.split("-", 1))
+        else:
+            start = value(part)
+            end = high if step else start
+
+        if not (low <= start <= high and low <= end <= high) or (step and int(step) < 1):
+            raise ValueError(f"The calendar field {text!r} is out of range, values go from {low} to {high}")
+
+        if start <= end:
+            values.update(range(start, end + 1, int(step or 1)))
+        elif names is WEEKDAY_NAMES:
+            # Weekday ranges can go over the end of the week, like sat-sun or fri-mon
+            values.update(day % 7 for day in range(start, end + 8, int(step or 1)))
+        else:
+            raise ValueError(f"The calendar range {part!r} goes backwards, only weekday ranges like sat-sun can wrap around")
+
+    return frozenset(values)
+
+def cron_fields(rule: str) -> list[list[str]]:
+    """The cron fields of a rule, translating daily times like "09:00 18:00 mon-fri" into them.
+    Daily times with different minutes each get their own fields, or every hour would get every minute"""
+    words = rule.split()
+
+    if not words or ":" not in words[0]:
+        return [words]
+
+    times = [word for word in words if ":" in word]
+    weekdays = [word for word in words if ":" not in word]
+
+    if len(weekdays) > 1:
+        raise ValueError(f"The calendar rule {rule!r} can only have one weekday filter after its times")
+
+    weekday = WEEKDAY_ALIASES.get(weekdays[0].lower(), weekdays[0]) if weekdays else "*"
+    hours = {} # the hours of each minute, in the order they're first given
+
+    for time in times:
+        hour, _, minute = time.partition(":")
+        hours.setdefault(minute, []).append(hour)
+
+    return [[minute, ",".join(minute_hours), "*", "*", weekday] for minute, minute_hours in hours.items()]
+
+class CalendarRule:
+    def __init__(self, rule: str, fields: list[str]):
+        if len(fields) != 5:
+            raise ValueError(f"The calendar rule {rule!r} needs daily times like 09:00 or the five fields of a cron expression")
+
+        minutes, hours, self.days, self.months, weekdays = (parse_field(field, *spec) for field, spec in zip(fields, FIELDS))
+        self.weekdays = frozenset(weekday % 7 for weekday in weekdays)
+
+        # Like cron, a day matches either field when both the day of the month and of the week are restricted
+        self.any_day = fields[2] != "*" and fields[4] != "*"
+        self.times = [timedelta(hours=hour, minutes=minute) for hour in sorted(hours) for minute in sorted(minutes)]
+
+    def matches(self, day: date) -> bool:
+        if day.month not in self.months:
+            return False
+
+        in_days = day.day in self.days
+        in_weekdays = (day.weekday() + 1) % 7 in self.weekdays
+
+        return in_days or in_weekdays if self.any_day else in_days and in_weekdays
+
+class Calendar:
+    def __init__(self, spec: str):
+        self.spec = spec
+        self.rules = [CalendarRule(rule, fields) for rule in spec.split(";") if rule.strip() for fields in cron_fields(rule)]
+
+        if not self.rules:
+            raise ValueError("The calendar needs at least one rule, like 12:00 or 09:00 18:00 mon-fri")
+
+    def local_times(self, first: date, last: date) -> list[datetime]:
+        """The calendar's naive local times on every day from first to last, in order"""
+        times = []
+        day = datetime(first.year, first.month, first.day)
+
+        for _ in range((last - first).days + 1):
+            matching = [rule for rule in self.rules if rule.matches(day)]
+
+            if len(matching) == 1:
+                times.extend(day + offset for offset in matching[0].times)
+            elif matching:
+                times.extend(day + offset for offset in sorted({offset for rule in matching for offset in rule.times}))
+
+            day += timedelta(days=1)
+
+        return times
+
+    def slots(self, start: datetime, end: datetime, timezone: str) -> list[datetime]:
+        """The calendar's times from start up to but not including end, in the given timezone"""
+        zone = get_zone(timezone)
+        local_times = self.local_times(start.astimezone(zone).date(), end.astimezone(zone).date())
+
+        slots = localize_series(zone, local_times)
+
+        # Only the first and last day can have slots outside the range
+        first = next((i for i, slot in enumerate(slots) if slot >= start), len(slots))
+        last = next((i for i in range(len(slots), first, -1) if slots[i - 1] < end), first)
+
+        return slots[first:last]
+
+def empty_slots(slots: list[datetime], taken: list[datetime]) -> list[datetime]:
+    """The slots no post was scheduled for. Each post takes the slot nearest to it, if it's closer to
+    that slot than half the way to the slot on its other side. Both lists are sorted and walked once together"""
+    if not slots:
+        return []
+
+    filled = [False] * len(slots)
+    last = len(slots) - 1
+    i = 0
+
+    for time in taken:
+        while i < last and time - slots[i] >= slots[i + 1] - time:
+            i += 1
+
+        # How far a post may be from its slot, the slots at the ends reach as far out as they do inwards
+        if time < slots[i]:
+            reach = (slots[i] - slots[i - 1] if i > 0 else slots[1] - slots[0] if last else timedelta(days=1)) / 2
+        else:
+            reach = (slots[i + 1] - slots[i] if i < last else slots[i] - slots[i - 1] if last else timedelta(days=1)) / 2
+
+        if abs(time - slots[i]) < reach:
+            filled[i] = True
+
+    return [slot for slot, is_filled in zip(slots, filled) if not is_filled]
@@ -0,0 +1,143 @@
+import json
+import os
+import time
+from datetime import datetime, timezone
+from bulk_scheduler import TokenBucket, call_with_backoff
+from schedule_model import ScheduledPost
+from telemetry import timed
+from templates import get_template
+
+SCHEDULE_CACHE_PATH = "schedule_cache.json"
+PAGE_SIZE = 40 # largest page the scheduled statuses endpoint hands out
+
+RECONCILE_INTERVAL = 60 # seconds between polls while the window is open
+
+def parse_scheduled_status(post) -> ScheduledPost:
+    """Turn a scheduled status from the api into a ScheduledPost"""
+    text = post["params"]["text"]
+    fields = get_template().parse(text)
+
+    return ScheduledPost(
+        # Posts written by hand or with an older template are shown by their first line
+        fields["title"] if fields and "title" in fields else text.split("\n", 1)[0],
+        post["id"],
+        post["scheduled_at"] # Mastodon.py already parses this into an aware datetime
+    )
+
+def iter_scheduled_pages(mastodon, bucket: TokenBucket):
+    """Yield the account's scheduled statuses as lists of ScheduledPosts, one page at a time"""
+    page = call_with_backoff(mastodon, bucket, mastodon.scheduled_statuses, limit=PAGE_SIZE)
+
+    while page:
+        with timed("parse_scheduled_page"):
+            posts = [parse_scheduled_status(post) for post in page]
+
+        yield posts
+
+        if len(page) < PAGE_SIZE:
+            return
+
+        page = call_with_backoff(mastodon, bucket, mastodon.fetch_next, page)
+
+def load_cached_schedule(path=SCHEDULE_CACHE_PATH) -> list[ScheduledPost]:
+    """The scheduled posts as they were last seen"""
+    if not os.path.exists(path):
+        return []
+
+    try:
+        with open(path, encoding="utf-8") as file:
+            rows = json.load(file)
+    except (OSError, ValueError):
+        return [] # a broken cache just means rendering has to wait for the server
+
+    return [ScheduledPost(row["title"], row["post_id"], datetime.fromisoformat(row["scheduled_time"])) for row in rows]
+
+def save_cached_schedule(posts, path=SCHEDULE_CACHE_PATH):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump([
+            {"title": post.title, "post_id": post.post_id, "scheduled_time": post.scheduled_time.isoformat()}
+            for post in posts
+        ], file)
+
+class Reconciler:
+    """Keeps track of what the server has scheduled with a few requests per poll instead of listing everything.
+
+    Each poll finds:
+    - published posts from their scheduled times, without any requests
+    - posts created elsewhere by paging forward with min_id from the newest known id
+    - posts removed or rescheduled elsewhere by checking one page of known ids, moving on to
+      the next older page every poll, so every post is checked once every len(posts) / 40 polls"""
+
+    def __init__(self, mastodon, bucket: TokenBucket, posts=()):
+        self.mastodon = mastodon
+        self.bucket = bucket
+        self.snapshot: dict[str, ScheduledPost] = {} # the posts as the server last reported them
+        self.newest_id = 0
+        self.verify_cursor = None # max_id of the next page to check, None for the newest page
+        self.stats = {"polls": 0, "requests": 0, "last_duration": 0.0, "last_requests": 0}
+
+        for post in posts:
+            self.snapshot[post.post_id] = post
+            self.newest_id = max(self.newest_id, int(post.post_id))
+
+    def fetch(self, **cursors):
+        self.stats["last_requests"] += 1
+        return [parse_scheduled_status(post) for post in call_with_backoff(self.mastodon, self.bucket, self.mastodon.scheduled_statuses, limit=PAGE_SIZE, **cursors)]
+
+    def update(self, post: ScheduledPost, now: datetime, changed: list):
+        self.newest_id = max(self.newest_id, int(post.post_id))
+
+        if post.scheduled_time <= now:
+            return # being published right now
+
+        known = self.snapshot.get(post.post_id)
+
+        if known is None or known.scheduled_time != post.scheduled_time or known.title != post.title:
+            changed.append(post)
+
+        self.snapshot[post.post_id] = post
+
+    def poll(self):
+        """Returns the (changed posts, removed post ids) since the last poll.
+        Changed posts are new or rescheduled, and removed posts include published ones"""
+        started = time.perf_counter()
+        now = datetime.now(tz=timezone.utc)
+        changed, removed = [], []
+        self.stats["last_requests"] = 0
+
+        for post_id, post in list(self.snapshot.items()):
+            if post.scheduled_time <= now:
+                removed.append(post_id)
+                del self.snapshot[post_id]
+
+        while True:
+            page = self.fetch(min_id=self.newest_id)
+
+            for post in page:
+                self.update(post, now, changed)
+
+            if len(page) < PAGE_SIZE:
+                break
+
+        page = self.fetch(max_id=self.verify_cursor) if self.verify_cursor else self.fetch()
+
+        # The page holds every post with an id from its lowest one up to the cursor, or from 0 if it's the last page
+        low = min(int(post.post_id) for post in page) if len(page) == PAGE_SIZE else 0
+        high = int(self.verify_cursor) if self.verify_cursor else float("inf")
+        listed = {post.post_id for post in page}
+
+        for post_id in list(self.snapshot):
+            if low <= int(post_id) < high and post_id not in listed:
+                removed.append(post_id)
+                del self.snapshot[post_id]
+
+        for post in page:
+            self.update(post, now, changed)
+
+        self.verify_cursor = str(low) if len(page) == PAGE_SIZE else None
+
+        self.stats["polls"] += 1
+        self.stats["requests"] += self.stats["last_requests"]
+        self.stats["last_duration"] = time.perf_counter() - started
+
+        return changed, removed
@@ -0,0 +1,108 @@
+"""Timezone lookups and the series of times posts are scheduled at.
+
+Slots are generated in local wall clock time and only then turned into aware datetimes,
+so a post scheduled for noon stays at noon across DST changes instead of drifting an hour
+like adding timedelta(days=1) to a localized datetime does"""
+
+import bisect
+import calendar
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def get_zone(name: str):
+    """The pytz timezone for name, looked up once per name"""
+    import pytz #timezone handling
+
+    return pytz.timezone(name)
+
+def localize_series(zone, local_times: list[datetime]) -> list[datetime]:
+    """Turn increasing naive local times into aware ones with the offset in effect at each of them,
+    the same as zone.localize(time) followed by zone.normalize would.
+
+    The zone's transitions are walked once alongside the times instead of being searched for every time.
+    Times right at a transition (skipped or repeated by the clock change) are left to pytz itself"""
+
+    transitions = getattr(zone, "_utc_transition_times", None)
+
+    if not transitions:
+        # Zones with a fixed offset, like UTC or Etc/GMT+5
+        return [zone.localize(time) for time in local_times]
+
+    infos = zone._transition_info
+    tzinfos = zone._tzinfos
+    bounds = transitions + [datetime.max]
+    last = len(transitions) - 1
+
+    slots = []
+    i = None
+
+    for time in local_times:
+        if i is None:
+            # Start with the period in effect a day before, the offset is never more than a day
+            i = max(0, bisect.bisect_right(transitions, time - timedelta(days=1)) - 1)
+
+        while i < last and time - infos[i + 1][0] >= bounds[i + 1]:
+            i += 1
+
+        utc = time - infos[i][0]
+
+        # The local time exists once and only in period i, unless it's skipped or repeated by a clock change
+        if (bounds[i] <= utc < bounds[i + 1]
+                and (i == 0 or time - infos[i - 1][0] >= bounds[i])
+                and time - infos[i + 1 if i < last else i][0] < bounds[i + 1]):
+            slots.append(time.replace(tzinfo=tzinfos[infos[i]]))
+        else:
+            slots.append(zone.normalize(zone.localize(time)))
+
+    return slots
+
+def daily_slots(start: datetime, count: int, timezone: str, every: int = 1) -> list[datetime]:
+    """count times every so many days from start, at start's wall clock time in the given timezone"""
+    zone = get_zone(timezone)
+    local_start = start.astimezone(zone).replace(tzinfo=None)
+
+    return localize_series(zone, [local_start + timedelta(days=i * every) for i in range(count)])
+
+def span_days(start: datetime, amount: int, units: str, timezone: str) -> int:
+    """Number of daily posts needed to cover amount days, weeks or *months (up to the end of the month) from start"""
+    if units == "weeks":
+        return amount * 7
+
+    if units == "*months":
+        # Counted in local dates, a difference of aware datetimes is an hour short across DST
+        local_start = start.astimezone(get_zone(timezone)).date()
+        month_index = local_start.month - 1 + amount - 1
+        year, month = local_start.year + month_index // 12, month_index % 12 + 1
+        end_date = local_start.replace(year=year, month=month, day=calendar.monthrange(year, month)[1])
+
+        return (end_date - local_start).days + 1
+
+    return amount
+
+def max_amount(start: datetime, units: str, timezone: str, posts: int) -> int:
+    """The most days, weeks or *months from start that posts daily posts cover, the inverse of span_days"""
+    if units == "weeks":
+        return posts // 7
+
+    if units == "*months":
+        amount = 0
+
+        while span_days(start, amount + 1, units, timezone) <= posts:
+            amount += 1
+
+        return amount
+
+    return posts
+
+def next_slot(latest: datetime | None, hour: int, minute: int, timezone: str, now: datetime = None) -> datetime:
+    """The first time at hour:minute in the given timezone that's after the latest scheduled post,
+    or after now if nothing is scheduled"""
+    zone = get_zone(timezone)
+    after = (latest or now or datetime.now(tz=zone)).astimezone(zone)
+
+    local_time = after.replace(tzinfo=None, hour=hour, minute=minute, second=0, microsecond=0)
+    slot = localize_series(zone, [local_time])[0]
+
+    # The same time next day if the time already passed that day
+    return slot if slot > after else localize_series(zone, [local_time + timedelta(days=1)])[0]
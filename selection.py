@@ -0,0 +1,145 @@
+import json
+import os
+import random
+from collections import Counter, deque
+from functools import cached_property
+from itertools import repeat
+from archive import Video
+
+SELECTION_CONFIG_PATH = "selection.json"
+
+# Give up on rejection sampling after this many excluded draws in a row and pick from the eligible videos directly
+MAX_REJECTIONS = 64
+
+def build_alias_table(weights: list[float]):
+    """Vose's alias method: O(n) setup for O(1) weighted draws"""
+    n = len(weights)
+    total = sum(weights)
+    scaled = [weight * n / total for weight in weights]
+
+    prob = [1.0] * n
+    alias = list(range(n))
+    small = [i for i, weight in enumerate(scaled) if weight < 1]
+    large = [i for i, weight in enumerate(scaled) if weight >= 1]
+
+    while small and large:
+        less, more = small.pop(), large.pop()
+        prob[less] = scaled[less]
+        alias[less] = more
+
+        scaled[more] += scaled[less] - 1
+        (small if scaled[more] < 1 else large).append(more)
+
+    # Whatever is left over is 1 up to floating point error
+    return prob, alias
+
+class VideoSelector:
+    """Draws random videos from the archive, optionally weighted by year, month or channel,
+    while avoiding videos posted within the no-repeat window and capping posts per channel in it.
+
+    Weights are per column value, e.g. channel_weights={"Some Channel": 2} makes that channel's videos
+    twice as likely. Values that aren't listed weigh 1, and a weight of 0 leaves those videos out.
+    no_repeat_days is only stored here, it's up to the caller to pass the links posted within it to choose.
+
+    Without weights or a channel cap nothing is built over the whole archive, so an archive that reads
+    its rows on access (see archive_sources.MappedArchive) only has the drawn rows read"""
+
+    def __init__(self, archive: list[Video], year_weights: dict = None, month_weights: dict = None,
+                 channel_weights: dict = None, no_repeat_window=60, channel_cap: int = None, no_repeat_days: int = None):
+        self.archive = archive
+        self.no_repeat_window = no_repeat_window
+        self.channel_cap = channel_cap
+        self.no_repeat_days = no_repeat_days
+
+        year_weights, month_weights, channel_weights = year_weights or {}, month_weights or {}, channel_weights or {}
+        self.weights = None # every video weighs 1
+
+        if year_weights or month_weights or channel_weights:
+            self.weights = [
+                year_weights.get(video.year, 1) * month_weights.get(video.month, 1) * channel_weights.get(video.channel, 1)
+                for video in archive
+            ]
+
+            if not any(self.weights):
+                raise ValueError("Every video in the archive has a weight of 0")
+
+            self.prob, self.alias = build_alias_table(self.weights)
+
+    @cached_property
+    def by_title(self):
+        return {video.title: video for video in self.archive}
+
+    def draw(self) -> Video:
+        """A weighted random video, ignoring the no-repeat window"""
+        i = int(random.random() * len(self.archive))
+
+        if self.weights is None:
+            return self.archive[i]
+
+        return self.archive[i if random.random() < self.prob[i] else self.alias[i]]
+
+    def choose(self, count: int, recent_titles=(), excluded_links=frozenset()) -> list[Video]:
+        """Pick count videos in posting order, continuing on from the recently posted or scheduled titles.
+        Videos whose alt link is in excluded_links are never picked, so fewer than count are returned
+        only when those are all of them. An archive smaller than the no-repeat window repeats the videos
+        posted longest ago instead"""
+        window = deque()
+        titles = Counter()
+        channels = Counter()
+
+        def remember(title: str):
+            # Channels only matter for the cap
+            video = self.by_title.get(title) if self.channel_cap is not None else None
+
+            window.append((title, video.channel if video else None))
+            titles[title] += 1
+            channels[window[-1][1]] += 1
+
+            if len(window) > self.no_repeat_window:
+                old_title, old_channel = window.popleft()
+                titles[old_title] -= 1
+                channels[old_channel] -= 1
+
+        def eligible(video: Video):
+            return not titles[video.title] and video.alt_link not in excluded_links and (self.channel_cap is None or channels[video.channel] < self.channel_cap)
+
+        for title in list(recent_titles)[-self.no_repeat_window:] if self.no_repeat_window else ():
+            remember(title)
+
+        picks = []
+
+        for _ in range(count):
+            for _ in range(MAX_REJECTIONS):
+                video = self.draw()
+
+                if eligible(video):
+                    break
+            else:
+                # Most of the archive is excluded, so draw from what's left instead of rejecting forever
+                candidates = [(video, weight) for video, weight in zip(self.archive, self.weights or repeat(1)) if weight and eligible(video)]
+
+                if not candidates:
+                    # Fewer videos may be posted than the window holds, so the one posted longest ago comes back
+                    last_posted = {title: i for i, (title, _) in enumerate(window)}
+                    allowed = [video for video, weight in zip(self.archive, self.weights or repeat(1)) if weight and video.alt_link not in excluded_links]
+                    oldest = min((last_posted.get(video.title, -1) for video in allowed), default=None)
+                    candidates = [(video, 1) for video in allowed if last_posted.get(video.title, -1) == oldest]
+
+                # Nothing left that may be posted, so no later pick could be either
+                if not candidates:
+                    break
+
+                video = random.choices([video for video, _ in candidates], [weight for _, weight in candidates])[0]
+
+            picks.append(video)
+            remember(video.title)
+
+        return picks
+
+def load_selection_config(path=SELECTION_CONFIG_PATH) -> dict:
+    """Keyword arguments for VideoSelector from the optional selection.json"""
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
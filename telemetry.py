@@ -0,0 +1,332 @@
+"""Where the scheduler's time goes.
+
+Latency histograms for requests (recorded by client) and for the scheduler's own work like loading
+the archive, paging through the schedule and rendering it, plus ways to get them out: JSON lines
+on stderr, Prometheus text format on a local port or in a file, and a profile of a whole run.
+
+Only the standard library is imported here, and only the light parts of it until they're needed,
+so timing something doesn't load anything heavy"""
+
+import atexit
+import json
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30) # upper bounds in seconds, anything slower goes in +Inf
+
+class EndpointStats:
+    __slots__ = ("bounds", "buckets", "count", "total", "slowest", "outcomes")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.outcomes = Counter() # status code or exception name -> count
+
+    def errors(self):
+        return sum(count for outcome, count in self.outcomes.items() if outcome != "ok" and outcome[0] not in "23")
+
+    def quantile(self, q: float):
+        """Upper bound of the bucket the q quantile falls in"""
+        rank, seen = q * self.count, 0
+
+        for bound, count in zip(self.bounds + (float("inf"),), self.buckets):
+            seen += count
+
+            if seen >= rank:
+                return bound
+
+    def copy(self):
+        stats = EndpointStats(self.bounds)
+        stats.buckets, stats.count, stats.total, stats.slowest, stats.outcomes = list(self.buckets), self.count, self.total, self.slowest, Counter(self.outcomes)
+
+        return stats
+
+class Metrics:
+    """Thread safe latency histograms and outcome counts per endpoint.
+    Every observation is also passed to the listeners, e.g. to log it"""
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.lock = threading.Lock()
+        self.endpoints: dict[str, EndpointStats] = {}
+        self.listeners = []
+
+    def observe(self, endpoint: str, seconds: float, outcome: str):
+        for listener in self.listeners:
+            listener(endpoint, seconds, outcome)
+
+        with self.lock:
+            stats = self.endpoints.get(endpoint) or self.endpoints.setdefault(endpoint, EndpointStats(self.bounds))
+
+            for i, bound in enumerate(self.bounds):
+                if seconds <= bound:
+                    break
+            else:
+                i = len(self.bounds)
+
+            stats.buckets[i] += 1
+            stats.count += 1
+            stats.total += seconds
+            stats.slowest = max(stats.slowest, seconds)
+            stats.outcomes[outcome] += 1
+
+    def snapshot(self) -> dict[str, EndpointStats]:
+        with self.lock:
+            return {endpoint: stats.copy() for endpoint, stats in self.endpoints.items()}
+
+    def dump(self, file=None, unit="requests"):
+        file = file or sys.stderr
+
+        with self.lock:
+            if not self.endpoints:
+                return print(f"No {unit} recorded yet", file=file)
+
+            for endpoint, stats in sorted(self.endpoints.items()):
+                print(
+                    f"{endpoint}: {stats.count} {unit}, {stats.errors()} errors, mean {stats.total / stats.count:.3f}s, "
+                    f"p50 <= {stats.quantile(0.5)}s, p95 <= {stats.quantile(0.95)}s, max {stats.slowest:.3f}s",
+                    file=file
+                )
+                print("   ", " | ".join(f"<= {bound}s: {count}" for bound, count in zip(self.bounds, stats.buckets)), f"| slower: {stats.buckets[-1]}", file=file)
+                print("   ", ", ".join(f"{outcome} x{count}" for outcome, count in stats.outcomes.most_common()), file=file)
+
+
+# Rendering and parsing take milliseconds, downloads and whole batches can take minutes
+OPERATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30, 120)
+
+DUMP_INTERVAL = 15 # seconds between rewrites of the metrics file
+SAMPLE_INTERVAL = 0.005 # seconds between stack samples while profiling
+
+operations = Metrics(OPERATION_BUCKETS)
+
+# As close to the process starting as it gets, scheduler.py imports this module before anything else
+STARTED = time.perf_counter()
+
+# Seconds from STARTED until startup got to each phase, in the order they were reached
+startup_phases = {}
+
+# Rate limit budgets to report, by account name
+rate_limits = {}
+
+@contextmanager
+def timed(operation: str):
+    """Record how long the block (or decorated function) took in operations, with the exception's name as the outcome if it raised"""
+    started = time.perf_counter()
+    outcome = "ok"
+
+    try:
+        yield
+    except BaseException as e:
+        outcome = type(e).__name__
+        raise
+    finally:
+        operations.observe(operation, time.perf_counter() - started, outcome)
+
+def mark_startup(phase: str):
+    """Record how long after the start the phase was reached, only the first time"""
+    if phase in startup_phases:
+        return
+
+    startup_phases[phase] = time.perf_counter() - STARTED
+    operations.observe(f"startup_{phase}", startup_phases[phase], "ok")
+
+def enable_json_logs(file=None):
+    """Write every request and operation to stderr as it finishes, one JSON object per line"""
+    from client import metrics
+
+    file = file or sys.stderr
+    lock = threading.Lock()
+
+    def logger(kind: str):
+        def log(name: str, seconds: float, outcome: str):
+            line = json.dumps({
+                "time": round(time.time(), 3), "kind": kind, "name": name,
+                "seconds": round(seconds, 6), "outcome": outcome, "thread": threading.current_thread().name
+            })
+
+            with lock:
+                print(line, file=file, flush=True)
+
+        return log
+
+    metrics.listeners.append(logger("request"))
+    operations.listeners.append(logger("operation"))
+
+def dump(file=None):
+    """Print the request and operation timings and the rate limit budgets"""
+    from client import metrics
+
+    file = file or sys.stderr
+
+    metrics.dump(file)
+    operations.dump(file, "operations")
+
+    if startup_phases:
+        print("Startup:", ", ".join(f"{phase} at {seconds:.3f}s" for phase, seconds in startup_phases.items()), file=file)
+
+    for name, bucket in sorted(rate_limits.items()):
+        tokens, capacity = bucket.headroom()
+        print(f"Rate limit of {name}: {tokens:.0f}/{capacity} requests left", file=file)
+
+def label_value(value: str):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def histogram_lines(name: str, label: str, description: str, metrics: Metrics):
+    lines = [f"# HELP {name}_seconds {description}", f"# TYPE {name}_seconds histogram"]
+    outcomes = [f"# HELP {name}_total Finished {name.split('_')[-1]} by outcome", f"# TYPE {name}_total counter"]
+
+    for key, stats in sorted(metrics.snapshot().items()):
+        labels = f'{label}="{label_value(key)}"'
+        seen = 0
+
+        for bound, count in zip(stats.bounds + ("+Inf",), stats.buckets):
+            seen += count
+            lines.append(f'{name}_seconds_bucket{{{labels},le="{bound}"}} {seen}')
+
+        lines.append(f"{name}_seconds_sum{{{labels}}} {stats.total}")
+        lines.append(f"{name}_seconds_count{{{labels}}} {stats.count}")
+        outcomes.extend(f'{name}_total{{{labels},outcome="{label_value(outcome)}"}} {count}' for outcome, count in sorted(stats.outcomes.items()))
+
+    return lines + outcomes
+
+def prometheus_text() -> str:
+    """Every metric in the Prometheus text exposition format"""
+    from client import metrics
+    from archive import stats as archive_stats
+
+    lines = histogram_lines("mastodon_requests", "endpoint", "Latency of HTTP requests to the instances and the archive", metrics)
+    lines += histogram_lines("scheduler_operations", "operation", "Time spent in the scheduler's own work", operations)
+
+    lines += [
+        "# HELP archive_cache_hits_total Archive loads served from the local cache", "# TYPE archive_cache_hits_total counter",
+        f"archive_cache_hits_total {archive_stats['hits']}",
+        "# HELP archive_cache_misses_total Archive loads that had to download the sheet", "# TYPE archive_cache_misses_total counter",
+        f"archive_cache_misses_total {archive_stats['misses']}",
+        "# HELP archive_load_seconds Time the latest archive load took", "# TYPE archive_load_seconds gauge",
+        f"archive_load_seconds {archive_stats['load_time']}",
+        "# HELP archive_cache_bytes Size of the archive cache on disk", "# TYPE archive_cache_bytes gauge",
+        f"archive_cache_bytes {archive_stats['size']}",
+        "# HELP rate_limit_remaining Requests the account can send right now", "# TYPE rate_limit_remaining gauge",
+        "# HELP rate_limit_capacity Requests the account can send per rate limit window", "# TYPE rate_limit_capacity gauge"
+    ]
+
+    for name, bucket in sorted(rate_limits.items()):
+        tokens, capacity = bucket.headroom()
+        lines.append(f'rate_limit_remaining{{account="{label_value(name)}"}} {tokens:.2f}')
+        lines.append(f'rate_limit_capacity{{account="{label_value(name)}"}} {capacity}')
+
+    return "\n".join(lines) + "\n"
+
+def write_metrics_file(path: str):
+    # Written to a temporary file first so a scraper never reads half a file
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        file.write(prometheus_text())
+
+    os.replace(path + ".tmp", path)
+
+def keep_metrics_file(path: str, interval=DUMP_INTERVAL):
+    """Rewrite the metrics file every interval seconds and on exit"""
+    def rewrite():
+        while True:
+            time.sleep(interval)
+            write_metrics_file(path)
+
+    atexit.register(write_metrics_file, path)
+    threading.Thread(target=rewrite, daemon=True, name="metrics-file").start()
+
+def serve_metrics(port: int, host="127.0.0.1"):
+    """Serve the metrics on http://host:port/metrics from a background thread, only to this machine by default"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                return self.send_error(404)
+
+            body = prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass # scrapes would drown out the scheduler's own output
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-server").start()
+
+    return server
+
+def install_dump_signal(path: str = None):
+    """Dump the timings to stderr, and rewrite the metrics file if there is one, whenever the process gets SIGUSR1"""
+    def on_signal(signum, frame):
+        dump()
+
+        if path:
+            write_metrics_file(path)
+
+    if hasattr(signal, "SIGUSR1"): # not on Windows
+        signal.signal(signal.SIGUSR1, on_signal)
+
+class Profiler:
+    """Profiles a run two ways: cProfile of the main thread, for pstats or snakeviz, and sampled stacks
+    of every thread in the collapsed format flamegraph.pl and speedscope read. Most of the work happens
+    in worker threads, which cProfile alone doesn't see"""
+
+    def __init__(self, path: str, interval=SAMPLE_INTERVAL):
+        import cProfile
+
+        self.base = os.path.splitext(path)[0]
+        self.interval = interval
+        self.profile = cProfile.Profile()
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self.sample, daemon=True, name="profiler")
+
+    def start(self):
+        self.sampler.start()
+        self.profile.enable()
+
+    def sample(self):
+        own = threading.get_ident()
+
+        while not self.stopped.wait(self.interval):
+            # Pool workers are merged into one root per pool, e.g. ThreadPoolExecutor-0
+            names = {thread.ident: re.sub(r"_\d+$", "", thread.name) for thread in threading.enumerate()}
+
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+
+                stack = []
+
+                while frame:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+
+                stack.append(names.get(ident, "thread"))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.profile.disable()
+        self.stopped.set()
+        self.sampler.join()
+
+        self.profile.dump_stats(self.base + ".prof")
+
+        with open(self.base + ".folded", "w", encoding="utf-8") as file:
+            for stack, count in self.stacks.most_common():
+                print(stack, count, file=file)
+
+        print(f"Profile written to {self.base}.prof and {self.base}.folded ({sum(self.stacks.values())} samples)", file=sys.stderr)
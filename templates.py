@@ -0,0 +1,110 @@
+import calendar #displaying month as name
+import os
+import re
+from string import Formatter
+
+TEMPLATE_PATH = "message_template.txt"
+
+DEFAULT_TEMPLATE = 'The randomly selected top pony video of the day is: "{title}" from "{channel}" from {month_name} {year}:\n{alt_link}'
+
+# The fields a template can use, with the expression rendering it from a Video and the pattern parsing it back
+FIELDS = {
+    "title": ("video.title", ".*"),
+    "channel": ("video.channel", ".*"),
+    "year": ("video.year", r"\d+"),
+    "month": ("video.month", r"\d+"),
+    "month_name": ("MONTH_NAMES[video.month]", r"[^\W\d_]+"),
+    "alt_link": ("video.alt_link", r"\S+")
+}
+
+CONVERSIONS = {"r": "repr", "s": "str", "a": "ascii"}
+
+class MonthNames(dict):
+    """Month number strings to month names, filled in the first time each spelling ("1", "01") is seen"""
+
+    def __missing__(self, month: str):
+        self[month] = calendar.month_name[int(month)]
+        return self[month]
+
+MONTH_NAMES = MonthNames()
+
+class MessageTemplate:
+    """A post message template in str.format syntax, compiled once into a function that renders
+    a Video with plain attribute lookups and string joins, and into a regex that parses it back.
+
+    The first free text field in the template matches greedily when parsing, so a title
+    containing quotes or the surrounding words still comes back whole"""
+
+    def __init__(self, text: str):
+        self.text = text
+        pieces = []
+        pattern = []
+        seen = set()
+        greedy_used = False
+
+        for literal, field, spec, conversion in Formatter().parse(text):
+            if literal:
+                pieces.append(repr(literal))
+                # Mastodon turns line breaks into html, so any whitespace is accepted between words when parsing
+                pattern.append(r"\s+".join(re.escape(word) for word in re.split(r"\s+", literal)))
+
+            if field is None:
+                continue
+
+            if field not in FIELDS:
+                raise ValueError(f"Unknown field {{{field}}} in the message template, expected one of {', '.join(FIELDS)}")
+            if "{" in spec:
+                raise ValueError(f"Nested fields aren't supported in the message template: {{{field}:{spec}}}")
+
+            expression, field_pattern = FIELDS[field]
+
+            if conversion:
+                expression = f"{CONVERSIONS[conversion]}({expression})"
+            if spec:
+                expression = f"format({expression}, {spec!r})"
+
+            pieces.append(expression)
+
+            if conversion or spec:
+                # Conversions and format specs change how a value looks, so those aren't parsed back
+                pattern.append(".*?")
+                continue
+
+            if field in seen:
+                pattern.append(f"(?P={field})")
+                continue
+
+            if field_pattern == ".*":
+                field_pattern = ".*?" if greedy_used else ".*"
+                greedy_used = True
+
+            pattern.append(f"(?P<{field}>{field_pattern})")
+            seen.add(field)
+
+        self.fields = seen
+        self.render = eval(f"lambda video: ''.join(({', '.join(pieces)},))", {"MONTH_NAMES": MONTH_NAMES})
+        self.pattern = re.compile(r"\s*" + "".join(pattern) + r"\s*", re.S)
+
+    def render_all(self, videos) -> list[str]:
+        return list(map(self.render, videos))
+
+    def parse(self, message: str) -> dict[str, str] | None:
+        """The fields a message was rendered from, or None if it wasn't rendered from this template"""
+        match = self.pattern.fullmatch(message)
+
+        return match.groupdict() if match else None
+
+_template = None
+
+def get_template(path=TEMPLATE_PATH) -> MessageTemplate:
+    """The template from the optional message template file, or the default one, compiled on first use"""
+    global _template
+
+    if _template is None:
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                _template = MessageTemplate(file.read().rstrip("\n"))
+        else:
+            _template = MessageTemplate(DEFAULT_TEMPLATE)
+
+    return _template
@@ -0,0 +1,67 @@
+import math
+import tkinter as tk #UI
+from tkinter import ttk #UI
+
+class VirtualList:
+    """Scrollable list of fixed height rows that only has widgets for the rows in view.
+
+    Rows are created by row_factory(parent) and must have a show(item) method. While scrolling,
+    the same row widgets are moved and shown with different items instead of creating new ones.
+    Items are stored oldest first but displayed newest first, so adding the newest item is an append"""
+
+    def __init__(self, parent, row_factory, row_height: int, **canvas_options):
+        self.row_factory = row_factory
+        self.row_height = row_height
+        self.items = []
+        self.pool = [] # (row, canvas window id) pairs
+
+        self.canvas = tk.Canvas(parent, **canvas_options)
+        self.canvas.pack(side="left", fill="both", expand=True)
+
+        self.scrollbar = ttk.Scrollbar(parent, orient="vertical", command=self.yview)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.canvas.bind("<Configure>", lambda e: self.refresh())
+
+    def yview(self, *args):
+        self.canvas.yview(*args)
+        self.refresh()
+
+    def set_items(self, items: list):
+        self.items = items
+        self.refresh()
+
+    def extend(self, items: list, refresh=True):
+        """Add items after the newest one. Without refresh the rows in view
+        aren't updated, so many additions can share a single refresh"""
+        self.items.extend(items)
+
+        if refresh:
+            self.refresh()
+
+    def visible_count(self):
+        height = max(self.canvas.winfo_height(), int(self.canvas.cget("height")))
+        return math.ceil(height / self.row_height) + 1 # + 1 for the partially visible row at the bottom
+
+    def refresh(self):
+        """Show the items that are in view on the pooled rows"""
+        width = self.canvas.winfo_width()
+        self.canvas.configure(scrollregion=(0, 0, width, max(len(self.items) * self.row_height, 1)))
+
+        while len(self.pool) < self.visible_count():
+            row = self.row_factory(self.canvas)
+            self.pool.append((row, self.canvas.create_window(0, 0, window=row, anchor="nw", height=self.row_height)))
+
+        first = int(self.canvas.canvasy(0) // self.row_height)
+
+        for offset, (row, window) in enumerate(self.pool):
+            index = first + offset
+
+            if index >= len(self.items):
+                self.canvas.itemconfigure(window, state="hidden")
+                continue
+
+            row.show(self.items[len(self.items) - index - 1])
+            self.canvas.coords(window, 0, index * self.row_height)
+            self.canvas.itemconfigure(window, state="normal", width=width)